@@ -1,48 +1,130 @@
 import sys
 import os
+import argparse
+import importlib
 
 # Add src to python path so imports work correctly
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
-from src import geo_mapper
-from src import weather_fetcher
-from legacy_v1 import data_merger
-from src import clean_and_split
-from src.config import RAW_CROP_DATA
+# Only the light modules are imported up front; geopy / requests / pandas are imported by
+# the stage that needs them, when it actually runs
+from src import pipeline
+from src import telemetry
+from src.config import (RAW_CROP_DATA, DISTRICT_MAPPING, WEATHER_DATA_DIR, WEATHER_LINKS,
+                        WEATHER_CUBE, WEATHER_CUBE_INDEX, MASTER_DATASET, MODEL_READY_DATASET,
+                        WEATHER_AUDIT, WEATHER_START_YEAR, WEATHER_END_YEAR)
 
-def run():
-    print("===================================================")
-    print("   KRISHISENSE: END-TO-END DATA PIPELINE v1.0")
-    print("===================================================")
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src')
+
+def code(*modules):
+    # A stage's own source (and the shared config) counts as an input, so edits re-run it
+    return [os.path.join(SRC_DIR, f"{m}.py") for m in modules] + [os.path.join(SRC_DIR, 'config.py')]
+
+def lazy(module, func):
+    """Stage function that imports src.<module> only when it is called."""
+    def call():
+        return getattr(importlib.import_module(f"src.{module}"), func)()
+    call.__name__ = func
+    return call
 
-    # Step 1: Geocoding
-    print("\n[STEP 1/4] Checking Geocoding...")
+def geocode():
     # We call extract just to verify file access, actual fetch is cached
+    geo_mapper = importlib.import_module('src.geo_mapper')
     locs = geo_mapper.extract_unique_locations(RAW_CROP_DATA)
     if locs is not None:
         geo_mapper.fetch_coordinates(locs)
-    
-    # Step 2: Weather Fetching
-    print("\n[STEP 2/4] Checking NASA Weather Data...")
-    # Attempts to find the main function in weather_fetcher
-    if hasattr(weather_fetcher, 'process_weather_data'):
-         weather_fetcher.process_weather_data()
-    elif hasattr(weather_fetcher, 'fetch_weather'):
-         weather_fetcher.fetch_weather()
-    else:
-        print("[WARN] Could not identify main function in weather_fetcher.")
 
-    # Step 3: Merging
-    print("\n[STEP 3/4] Merging Government & Weather Data...")
-    data_merger.merge_data()
+STAGES = [
+    pipeline.Stage('geocode', geocode,
+                   inputs=[RAW_CROP_DATA] + code('geo_mapper', 'crop_data'),
+                   outputs=[DISTRICT_MAPPING]),
+    pipeline.Stage('weather', lazy('weather_fetcher', 'fetch_weather'),
+                   inputs=[DISTRICT_MAPPING] + code('weather_fetcher'),
+                   outputs=[WEATHER_DATA_DIR, WEATHER_LINKS],
+                   params={'start': WEATHER_START_YEAR, 'end': WEATHER_END_YEAR}),
+    # Re-pack the daily files so downstream stages read the memory-mapped cube
+    pipeline.Stage('cube', lazy('weather_cube', 'build_cube'),
+                   inputs=[WEATHER_DATA_DIR, WEATHER_LINKS] + code('weather_cube'),
+                   outputs=[WEATHER_CUBE, WEATHER_CUBE_INDEX]),
+    # Grades every district-year of the weather files; re-runs whenever a file changes
+    pipeline.Stage('audit', lazy('audit_weather', 'audit_data'),
+                   inputs=[DISTRICT_MAPPING, WEATHER_DATA_DIR, WEATHER_LINKS] + code('audit_weather', 'weather_cube'),
+                   outputs=[WEATHER_AUDIT]),
+    # The audit report decides which district-years are skipped
+    pipeline.Stage('merge', lazy('data_merger', 'merge_data'),
+                   inputs=[RAW_CROP_DATA, WEATHER_DATA_DIR, WEATHER_LINKS, WEATHER_AUDIT, WEATHER_CUBE, WEATHER_CUBE_INDEX]
+                          + code('data_merger', 'crop_data', 'weather_cube', 'audit_weather'),
+                   outputs=[MASTER_DATASET]),
+    pipeline.Stage('split', lazy('clean_and_split', 'clean_and_split'),
+                   inputs=[MASTER_DATASET, WEATHER_CUBE, WEATHER_CUBE_INDEX] + code('clean_and_split', 'agro_features'),
+                   outputs=[MODEL_READY_DATASET]),
+]
+
+# Subcommand -> pipeline stage it runs on its own
+STAGE_COMMANDS = {
+    'geocode': ('geocode', "find coordinates for districts missing from the mapping"),
+    'fetch': ('weather', "download / extend the NASA POWER weather series"),
+    'cube': ('cube', "re-pack the daily weather files into the memory-mapped cube"),
+    'audit': ('audit', "grade weather coverage per district-year (bad years are skipped by the merge)"),
+    'merge': ('merge', "merge crop and weather data into the master dataset"),
+    'split': ('split', "clean, engineer features and write the model-ready dataset"),
+}
 
-    # Step 4: Preprocessing
-    print("\n[STEP 4/4] Cleaning & Splitting for Models...")
-    clean_and_split.clean_and_split()
+# Subcommand -> (module, function, help) of the standalone tools
+TOOL_COMMANDS = {
+    'diagnose': ('diagnose_mismatch', 'diagnose_specific', "trace why a crop row finds no weather file"),
+}
+
+def run(force=(), dry_run=False):
+    print("===================================================")
+    print("   KRISHISENSE: END-TO-END DATA PIPELINE v1.0")
+    print("===================================================")
+
+    # Only stages whose inputs, code or outputs changed since their last successful run execute
+    pipeline.run_stages(STAGES, force=force, dry_run=dry_run)
 
     print("\n===================================================")
     print("   PIPELINE COMPLETE. READY FOR MODELING.")
     print("===================================================")
 
+def run_stage(name, dry_run=False):
+    """One stage on its own, always executed; its state is recorded so a later `run` can skip it."""
+    stage = next(s for s in STAGES if s.name == name)
+    pipeline.run_stages([stage], force=[name], dry_run=dry_run)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="KrishiSense data pipeline. Without a command, "
+                                                 "runs the stages whose inputs changed since the last run.")
+    parser.add_argument('--metrics', nargs='?', const=telemetry.LOG_PATH, metavar='PATH',
+                        help=f"append per-stage timings, memory, row counts and cache hit rates (default {telemetry.LOG_PATH})")
+    parser.add_argument('--profile', action='store_true', help="with --metrics: also dump a cProfile per stage")
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+
+    run_cmd = commands.add_parser('run', help="incremental end-to-end run (the default)")
+    for p in [parser, run_cmd]:
+        p.add_argument('--force', nargs='+', default=[], metavar='STAGE',
+                       help=f"re-run these stages anyway: {', '.join(s.name for s in STAGES)} or 'all'")
+        p.add_argument('--dry-run', action='store_true', help="only report which stages would run")
+
+    for command, (_, help_text) in STAGE_COMMANDS.items():
+        commands.add_parser(command, help=help_text).add_argument(
+            '--dry-run', action='store_true', help="only report the stage, do not run it")
+    for command, (_, _, help_text) in TOOL_COMMANDS.items():
+        commands.add_parser(command, help=help_text)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        telemetry.configure(log_path=args.metrics, profile=args.profile)
+
+    if args.command in STAGE_COMMANDS:
+        run_stage(STAGE_COMMANDS[args.command][0], dry_run=args.dry_run)
+    elif args.command in TOOL_COMMANDS:
+        module, func, _ = TOOL_COMMANDS[args.command]
+        getattr(importlib.import_module(f"src.{module}"), func)()
+    else:
+        run(force=args.force, dry_run=args.dry_run)
+
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    main()
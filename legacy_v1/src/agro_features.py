@@ -0,0 +1,183 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import os
+from src import weather_cube
+from src import schema
+from src import telemetry
+from src.config import (AGRO_FEATURES, SEASON_WINDOWS, GDD_BASE_TEMP, DRY_DAY_RAIN_MM, HEAVY_RAIN_MM,
+                        HEAT_STRESS_TEMP, DISEASE_HUMIDITY, DISEASE_TEMP_RANGE, DISEASE_MIN_DAYS)
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+FEATURES_PATH = AGRO_FEATURES
+WINDOWS = SEASON_WINDOWS
+FEATURE_COLUMNS = ['GDD', 'Longest_Dry_Spell', 'Heavy_Rain_Days', 'Heat_Stress_Days', 'Disease_Windows']
+
+def settings():
+    """Thresholds the features depend on (part of the cache key)."""
+    return {
+        'windows': {k: list(v) for k, v in WINDOWS.items()},
+        'gdd_base': GDD_BASE_TEMP,
+        'dry_mm': DRY_DAY_RAIN_MM,
+        'heavy_mm': HEAVY_RAIN_MM,
+        'heat_temp': HEAT_STRESS_TEMP,
+        'disease_humidity': DISEASE_HUMIDITY,
+        'disease_temp': list(DISEASE_TEMP_RANGE),
+        'disease_days': DISEASE_MIN_DAYS,
+        'schema': schema.SCHEMA_VERSION
+    }
+
+# ==========================================
+# VECTOR HELPERS
+# ==========================================
+def run_lengths(cond, starts):
+    """
+    Length of the run of True days ending at each day, for every series at once.
+    cond is (series, day); runs restart at every window start so they never leak across windows.
+    """
+    day = np.arange(cond.shape[1])
+    last_break = np.where(cond, -1, day)
+    last_break[:, starts] = np.maximum(last_break[:, starts], starts - 1)
+    np.maximum.accumulate(last_break, axis=1, out=last_break)
+    return day - last_break
+
+def season_segments(dates, season):
+    """(crop years, first day index, end day index + 1) of a season's windows fully inside dates."""
+    years = np.unique(dates.astype('datetime64[Y]').astype(int) + 1970)
+    start, end = weather_cube.season_bounds([season] * len(years), years, WINDOWS)
+    keep = (start >= dates[0]) & (end <= dates[-1])
+    i = (start - dates[0]).astype(np.int64)
+    j = (end - dates[0]).astype(np.int64) + 1
+    return years[keep], i[keep], j[keep]
+
+def window_reduce(ufunc, values, i, j):
+    """ufunc over days i..j-1 of every series, for all windows in one reduceat call."""
+    # One padding day keeps the last boundary a valid index
+    padded = np.concatenate([values, np.zeros_like(values[:, :1])], axis=1)
+    bounds = np.column_stack([i, j]).ravel()
+    return ufunc.reduceat(padded, bounds, axis=1)[:, ::2]
+
+# ==========================================
+# FEATURES
+# ==========================================
+def compute_features(cube):
+    """
+    Daily agro-climatic features per (Weather_Key, Season, Year) for every season in SEASON_WINDOWS:
+    - GDD: growing degree days, sum of max(T2M - GDD_BASE_TEMP, 0)
+    - Longest_Dry_Spell: most consecutive days with rain below DRY_DAY_RAIN_MM
+    - Heavy_Rain_Days: days with at least HEAVY_RAIN_MM of rain
+    - Heat_Stress_Days: days with T2M above HEAT_STRESS_TEMP
+    - Disease_Windows: runs of DISEASE_MIN_DAYS+ humid (>= DISEASE_HUMIDITY) days inside DISEASE_TEMP_RANGE
+    Every district and day is processed in array operations; only the season types are looped.
+    """
+    t, r, h = (cube.variables.index(v) for v in ['T2M', 'Rain', 'Humidity'])
+    temp = np.asarray(cube.data[:, :, t], dtype=np.float64)
+    rain = np.asarray(cube.data[:, :, r], dtype=np.float64)
+    humidity = np.asarray(cube.data[:, :, h], dtype=np.float64)
+
+    # Daily indicators (NaN days count as nothing)
+    observed = ~(np.isnan(temp) & np.isnan(rain) & np.isnan(humidity))
+    gdd = np.nan_to_num(np.clip(temp - GDD_BASE_TEMP, 0, None))
+    dry = rain < DRY_DAY_RAIN_MM
+    heavy = rain >= HEAVY_RAIN_MM
+    heat = temp > HEAT_STRESS_TEMP
+    low, high = DISEASE_TEMP_RANGE
+    disease = (humidity >= DISEASE_HUMIDITY) & (temp >= low) & (temp <= high)
+
+    # Stored series -> every district key linked to it
+    keys = list(cube.positions)
+    rows = np.array([cube.positions[k] for k in keys])
+
+    frames = []
+    for season in WINDOWS:
+        years, i, j = season_segments(cube.dates, season)
+        if len(years) == 0:
+            continue
+        days = window_reduce(np.add, observed.astype(np.int32), i, j)
+        table = {
+            'GDD': window_reduce(np.add, gdd, i, j),
+            'Longest_Dry_Spell': window_reduce(np.maximum, run_lengths(dry, i), i, j),
+            'Heavy_Rain_Days': window_reduce(np.add, heavy.astype(np.int32), i, j),
+            'Heat_Stress_Days': window_reduce(np.add, heat.astype(np.int32), i, j),
+            'Disease_Windows': window_reduce(np.add, (run_lengths(disease, i) == DISEASE_MIN_DAYS).astype(np.int32), i, j)
+        }
+        season_df = pd.DataFrame({
+            'Weather_Key': np.repeat(keys, len(years)),
+            'Season': season,
+            'Year': np.tile(years, len(keys))
+        })
+        for name, values in table.items():
+            values = np.where(days > 0, values, np.nan)[rows]
+            season_df[name] = values.ravel()
+        frames.append(season_df)
+
+    if not frames:
+        return pd.DataFrame(columns=['Weather_Key', 'Season', 'Year'] + FEATURE_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+# ==========================================
+# CACHE
+# ==========================================
+def cache_key():
+    """Changes whenever the cube is rebuilt or a threshold changes."""
+    parts = [settings()]
+    for path in [weather_cube.CUBE_PATH, weather_cube.INDEX_PATH]:
+        stat = os.stat(path)
+        parts.append([os.path.basename(path), stat.st_size, stat.st_mtime])
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+def load_features(rebuild=False):
+    """
+    Feature table from FEATURES_PATH, recomputed from the weather cube only when the cube
+    or the thresholds changed since it was written. The cube is rebuilt first if it is older
+    than the weather files. Returns None if there is no cube.
+    """
+    cube = weather_cube.load_cube()
+    if cube is None and os.path.exists(weather_cube.INDEX_PATH):
+        cube = weather_cube.build_cube()
+    if cube is None:
+        print("[WARN] Weather cube not built; agro-climatic features unavailable.")
+        return None
+
+    meta_path = os.path.splitext(FEATURES_PATH)[0] + ".json"
+    key = cache_key()
+    if not rebuild and os.path.exists(FEATURES_PATH) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f).get('key') == key:
+                telemetry.count('agro_features.hit')
+                return pd.read_parquet(FEATURES_PATH)
+
+    telemetry.count('agro_features.miss')
+    print("[INFO] Computing daily agro-climatic features...")
+    features = schema.apply_schema(compute_features(cube))
+    os.makedirs(os.path.dirname(FEATURES_PATH), exist_ok=True)
+    tmp_path = FEATURES_PATH + ".tmp"
+    features.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, FEATURES_PATH)
+    with open(meta_path, 'w') as f:
+        json.dump({'key': key, 'rows': len(features)}, f)
+    print(f"[SUCCESS] {len(features)} district-season rows saved to {FEATURES_PATH}")
+    return features
+
+def attach_features(df):
+    """Left-joins the features onto a master-style frame (State, District, Year, Season)."""
+    features = load_features()
+    if features is None:
+        return df
+    keys = (df['District'].astype(str) + "_" + df['State'].astype(str)).str.replace(" ", "_").str.lower()
+    seasons = df['Season'].astype(str).str.strip()
+    lookup = pd.DataFrame({
+        'Weather_Key': keys.values,
+        'Season': seasons.where(seasons.isin(WINDOWS), 'Whole Year').values,
+        'Year': df['Year'].astype(int).values
+    })
+    joined = lookup.merge(features, on=['Weather_Key', 'Season', 'Year'], how='left')
+    df = df.copy()
+    df[FEATURE_COLUMNS] = joined[FEATURE_COLUMNS].values
+    return df
+
+if __name__ == "__main__":
+    load_features(rebuild=True)
@@ -1,13 +1,128 @@
 import pandas as pd
+import numpy as np
+import calendar
 import os
-from src.config import DISTRICT_MAPPING, WEATHER_DATA_DIR
+from src.config import DISTRICT_MAPPING, WEATHER_DATA_DIR, WEATHER_AUDIT, WEATHER_START_YEAR, AUDIT_MIN_COVERAGE
+from src import weather_cube
+from src import parallel
 # ==========================================
 # CONFIGURATION
 # ==========================================
 MAPPING_FILE = DISTRICT_MAPPING
 WEATHER_DIR = WEATHER_DATA_DIR
+REPORT_PATH = WEATHER_AUDIT
+MIN_COVERAGE = AUDIT_MIN_COVERAGE
+REPORT_COLUMNS = ['State', 'District', 'Weather_Key', 'Source', 'Year', 'Days', 'Missing_Days',
+                  'Fill_Values', 'Coverage', 'Status']
 
-def audit_data():
+# ==========================================
+# CONTENT SCAN (runs in worker processes)
+# ==========================================
+def scan_file(file_path):
+    """
+    Per calendar year of one weather file: days present, valid days (all variables real)
+    and fill values (-999). Dates stay integers (YYYYMMDD); a repeated date counts once.
+    """
+    try:
+        df = pd.read_csv(file_path)
+        dates = df.iloc[:, 0].to_numpy(dtype=np.int64)
+        values = df[weather_cube.VARIABLES].to_numpy(dtype=np.float64)
+    except Exception:
+        return pd.DataFrame({'Year': [np.nan], 'Status': ['unreadable']})
+
+    dates, last = np.unique(dates[::-1], return_index=True)   # last row of each date wins
+    values = values[::-1][last]
+    fill = (values == weather_cube.FILL_VALUE)
+    valid = ~(fill | np.isnan(values)).any(axis=1)
+    years, year = np.unique(dates // 10000, return_inverse=True)
+    return pd.DataFrame({
+        'Year': years,
+        'Days': np.bincount(year, minlength=len(years)),
+        'Valid_Days': np.bincount(year, weights=valid, minlength=len(years)).astype(np.int64),
+        'Fill_Values': np.bincount(year, weights=fill.sum(axis=1), minlength=len(years)).astype(np.int64)
+    })
+
+def coverage(scanned):
+    """
+    Completes the scan to every (file, year) from WEATHER_START_YEAR to the latest year any file
+    reaches, so truncated files show their missing years as coverage 0, then grades each year:
+    ok (complete), repair (gaps / fill values, read as NaN) or bad (coverage < AUDIT_MIN_COVERAGE).
+    """
+    readable = scanned[scanned['Year'].notna()]
+    if readable.empty:
+        return scanned
+    first = min(WEATHER_START_YEAR, int(readable['Year'].min()))
+    grid = pd.MultiIndex.from_product([readable['Path'].unique(), range(first, int(readable['Year'].max()) + 1)],
+                                      names=['Path', 'Year'])
+    years = readable.set_index(['Path', 'Year'])[['Days', 'Valid_Days', 'Fill_Values']].reindex(grid, fill_value=0)
+    year_days = np.array([366 if calendar.isleap(y) else 365 for y in years.index.get_level_values('Year')])
+    years['Missing_Days'] = year_days - years['Days']
+    years['Coverage'] = (years['Valid_Days'] / year_days).round(4)
+    years['Status'] = np.where(years['Coverage'] < MIN_COVERAGE, 'bad',
+                               np.where((years['Missing_Days'] > 0) | (years['Fill_Values'] > 0), 'repair', 'ok'))
+    years = years.drop(columns=['Valid_Days']).reset_index()
+    return pd.concat([years, scanned[scanned['Year'].isna()]], ignore_index=True)
+
+def scan_files(file_paths):
+    frames = []
+    for file_path in file_paths:
+        table = scan_file(file_path)
+        table.insert(0, 'Path', file_path)
+        frames.append(table)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+# ==========================================
+# REPORT
+# ==========================================
+def build_report(workers=None):
+    """
+    One directory index (weather_cube.weather_sources) joined to the mapping in one vectorized pass,
+    then every weather file's content scanned once, in parallel batches. Returns the per-district,
+    per-year report (districts without coordinates / files get one row with that Status).
+    """
+    mapping = pd.read_csv(MAPPING_FILE)
+    report = pd.DataFrame({'State': mapping['state_name'].astype(str), 'District': mapping['district_name'].astype(str)})
+    report['Weather_Key'] = (report['District'] + "_" + report['State']).str.replace(" ", "_").str.lower()
+
+    # District -> weather file (grid-cell file via weather_links.csv, or legacy per-district file)
+    sources = weather_cube.weather_sources(WEATHER_DIR)
+    report['Path'] = report['Weather_Key'].map(sources)
+    no_coords = mapping['latitude'].isna().values | mapping['longitude'].isna().values
+    report['Missing'] = np.where(no_coords, 'no_coordinates', 'missing_file')
+
+    files = sorted(report['Path'].dropna().unique())
+    workers = workers or parallel.WORKERS
+    batches = [list(b) for b in np.array_split(files, max(1, min(len(files), workers * 4))) if len(b)]
+    scanned = parallel.map_shards(scan_files, batches, workers)
+    scanned = coverage(pd.concat(scanned, ignore_index=True)) if scanned else pd.DataFrame(columns=['Path', 'Status'])
+
+    report = report.merge(scanned, on='Path', how='left')
+    report['Status'] = report['Status'].fillna(report['Missing'])
+    report['Source'] = [os.path.relpath(p, WEATHER_DIR) if isinstance(p, str) else None for p in report['Path']]
+    for col in ['Year', 'Days', 'Missing_Days', 'Fill_Values']:
+        report[col] = report[col].astype('Int64')
+    return report[REPORT_COLUMNS]
+
+def save_report(report, path=None):
+    path = path or REPORT_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    report.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def bad_years(path=None):
+    """
+    (Weather_Key, Year) pairs the last audit marked 'bad' (coverage below AUDIT_MIN_COVERAGE),
+    for the merge to skip. Empty if no audit has been run.
+    """
+    path = path or REPORT_PATH
+    if not os.path.exists(path):
+        return pd.DataFrame({'Weather_Key': pd.Series(dtype=str), 'Year': pd.Series(dtype=int)})
+    report = pd.read_csv(path, usecols=['Weather_Key', 'Year', 'Status'])
+    bad = report[(report['Status'] == 'bad') & report['Year'].notna()]
+    return pd.DataFrame({'Weather_Key': bad['Weather_Key'].values, 'Year': bad['Year'].astype(int).values})
+
+def audit_data(workers=None):
     print(f" Starting Data Audit...")
     print(f"Checking Mapping File: {MAPPING_FILE}")
     print(f"Checking Weather Folder: {WEATHER_DIR}")
@@ -17,57 +132,53 @@ def audit_data():
         print(" CRITICAL ERROR: district_mapping.csv not found.")
         return
 
-    # Load the target list
-    df = pd.read_csv(MAPPING_FILE)
-    
-    total_districts = len(df)
-    missing_coords = 0
-    downloaded_files = 0
-    missing_downloads = []
-
+    report = build_report(workers)
+    districts = report.drop_duplicates('Weather_Key')
+    total_districts = len(districts)
+    missing_coords = int((districts['Status'] == 'no_coordinates').sum())
+    missing_downloads = districts[districts['Status'] == 'missing_file']
+    downloaded_files = total_districts - missing_coords - len(missing_downloads)
     print(f"Total Districts in Government Data: {total_districts}")
 
-    # Loop through and check
-    for index, row in df.iterrows():
-        district = str(row['district_name'])
-        state = str(row['state_name'])
-        
-        # 1. Check if we even have coordinates (GeoMapper success/fail)
-        if pd.isna(row['latitude']) or pd.isna(row['longitude']):
-            missing_coords += 1
-            continue # We couldn't download this anyway
-
-        # 2. Check if the file exists (WeatherFetcher success/fail)
-        # Reconstruct the exact filename logic used in weather_fetcher.py
-        safe_name = f"{district}_{state}".replace(" ", "_").lower()
-        expected_filename = f"{safe_name}.csv"
-        file_path = os.path.join(WEATHER_DIR, expected_filename)
-
-        if os.path.exists(file_path):
-            downloaded_files += 1
-        else:
-            missing_downloads.append(f"{district} ({state})")
-
     # ==========================================
     # FINAL REPORT
     # ==========================================
+    years = report[report['Year'].notna()]
     print("-" * 40)
     print(" AUDIT RESULTS")
     print("-" * 40)
     print(f" Successfully Downloaded:    {downloaded_files}")
     print(f"  Skipped (No Coordinates):    {missing_coords} (GeoMapper couldn't find these)")
     print(f" Missing (Download Failed):    {len(missing_downloads)} (Network/API errors)")
+    print(f" Unreadable Files:    {int((report['Status'] == 'unreadable').sum())}")
+    print("-" * 40)
+    print(f" District-years checked:    {len(years)}")
+    print(f"   Complete:    {int((years['Status'] == 'ok').sum())}")
+    print(f"   Gaps / fill values (repaired as NaN):    {int((years['Status'] == 'repair').sum())}")
+    print(f"   Coverage below {MIN_COVERAGE:.0%} (skipped by the merge):    {int((years['Status'] == 'bad').sum())}")
+    print(f"   Missing days: {int(years['Missing_Days'].sum())}, fill values: {int(years['Fill_Values'].sum())}")
     print("-" * 40)
-    
+
     completion_rate = (downloaded_files / total_districts) * 100
     print(f" Project Readiness: {completion_rate:.2f}%")
 
-    if missing_downloads:
+    if len(missing_downloads):
         print("\n List of Missing Downloads (Try running weather_fetcher.py again):")
-        for d in missing_downloads[:10]: # Print first 10 only
+        for d in (missing_downloads['District'] + " (" + missing_downloads['State'] + ")")[:10]: # Print first 10 only
             print(f" - {d}")
         if len(missing_downloads) > 10:
             print(f" ... and {len(missing_downloads) - 10} more.")
 
+    worst = years[years['Status'] != 'ok'].sort_values('Coverage').head(10)
+    if len(worst):
+        print("\n Lowest Coverage District-Years:")
+        for _, row in worst.iterrows():
+            print(f" - {row['District']} ({row['State']}) {row['Year']}: {row['Coverage']:.1%} "
+                  f"({row['Missing_Days']} missing days, {row['Fill_Values']} fill values)")
+
+    save_report(report)
+    print(f"\n[SUCCESS] Report saved to {REPORT_PATH}")
+    return report
+
 if __name__ == "__main__":
-    audit_data()
\ No newline at end of file
+    audit_data()
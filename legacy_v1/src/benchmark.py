@@ -0,0 +1,204 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from src import crop_data, data_merger, weather_cube, agro_features, clean_and_split, spill, synthetic_data, audit_weather
+from src.config import BASE_DIR, BENCHMARK_RESULTS, BENCHMARK_SCALES
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+RESULTS_PATH = BENCHMARK_RESULTS
+SCALES = BENCHMARK_SCALES
+WEATHER_LOOKUPS = 1000   # get_annual_weather calls per run
+
+# ==========================================
+# WORKSPACE
+# ==========================================
+@contextlib.contextmanager
+def workspace(root, paths):
+    """
+    Points every stage at the synthetic files under root, restoring the real paths afterwards,
+    so a benchmark never reads or overwrites project data.
+    """
+    interim, processed = os.path.join(root, 'interim'), os.path.join(root, 'processed')
+    patches = [
+        (crop_data, 'CROP_DATA_PATH', paths['crop']),
+        (crop_data, 'CACHE_DIR', os.path.join(interim, 'cache')),
+        (data_merger, 'CROP_DATA_PATH', paths['crop']),
+        (data_merger, 'WEATHER_DIR', paths['weather']),
+        (data_merger, 'OUTPUT_PATH', os.path.join(processed, 'master.csv')),
+        (weather_cube, 'WEATHER_DIR', paths['weather']),
+        (weather_cube, 'CELL_DIR', os.path.join(paths['weather'], 'cells')),
+        (weather_cube, 'LINKS_PATH', os.path.join(interim, 'weather_links.csv')),
+        (weather_cube, 'CUBE_PATH', os.path.join(interim, 'weather_cube.npy')),
+        (weather_cube, 'INDEX_PATH', os.path.join(interim, 'weather_cube_index.json')),
+        (weather_cube, 'ANNUAL_PATH', os.path.join(interim, 'weather_annual.csv')),
+        (agro_features, 'FEATURES_PATH', os.path.join(interim, 'agro_features.parquet')),
+        (clean_and_split, 'MASTER_DATASET', os.path.join(processed, 'master.csv')),
+        (clean_and_split, 'MODEL_READY_DATASET', os.path.join(processed, 'model_ready', 'crops')),
+        (spill, 'SPILL_ROOT', os.path.join(interim, 'spill')),
+        (audit_weather, 'REPORT_PATH', os.path.join(interim, 'weather_audit.csv')),
+    ]
+    saved = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    try:
+        for module, name, value in patches:
+            setattr(module, name, value)
+        yield
+    finally:
+        for module, name, value in saved:
+            setattr(module, name, value)
+
+def remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+# ==========================================
+# STAGES
+# ==========================================
+def annual_lookups(districts, years):
+    """get_annual_weather over random (district, year) pairs with a fresh per-district cache."""
+    data_merger.clear_weather_cache()
+    pairs = list(zip(districts['district_name'], districts['state_name']))
+    rng = np.random.default_rng(0)
+    hits = 0
+    for i in rng.integers(0, len(pairs), WEATHER_LOOKUPS):
+        district, state = pairs[i]
+        temp, _, _ = data_merger.get_annual_weather(district, state, int(rng.choice(years)))
+        hits += temp is not None
+    return hits
+
+def master_rows():
+    path = data_merger.OUTPUT_PATH
+    return sum(1 for _ in open(path)) - 1 if os.path.exists(path) else 0
+
+def stages(districts, years):
+    """(name, setup before each measurement, stage call, rows produced after it)."""
+    crop_cache = lambda: remove(crop_data.CACHE_DIR)
+    return [
+        ('load_gov_data (parse)', crop_cache, lambda: len(data_merger.load_gov_data()), None),
+        ('load_gov_data (cached)', None, lambda: len(data_merger.load_gov_data()), None),
+        ('build_cube', None, lambda: len(weather_cube.build_cube().districts), None),
+        ('merge_data (cold weather)', lambda: remove(weather_cube.ANNUAL_PATH), data_merger.merge_data, master_rows),
+        ('merge_data (warm)', None, data_merger.merge_data, master_rows),
+        ('get_annual_weather', None, lambda: annual_lookups(districts, years), None),
+        ('clean_and_split', lambda: remove(agro_features.FEATURES_PATH), clean_and_split.clean_and_split, None),
+    ]
+
+def measure(setup, func, rows, memory=True):
+    """Wall time of one call; peak Python heap (tracemalloc) from a second, separate call."""
+    quiet = io.StringIO()
+    with contextlib.redirect_stdout(quiet), contextlib.redirect_stderr(quiet):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - started
+        peak_mb = None
+        if memory:
+            if setup:
+                setup()
+            tracemalloc.start()
+            func()
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+    n = rows() if rows else (result if isinstance(result, (int, np.integer)) else None)
+    return {'seconds': round(seconds, 4), 'peak_mb': None if peak_mb is None else round(peak_mb, 2),
+            'rows': None if n is None else int(n)}
+
+# ==========================================
+# RUN / STORE / COMPARE
+# ==========================================
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BASE_DIR,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def run_benchmarks(scales, memory=True, keep=False):
+    """Generates each scale's synthetic inputs offline, runs every stage and returns result rows."""
+    revision = git_revision()
+    results = []
+    for scale in scales:
+        n_districts, n_years, n_crops = SCALES[scale]
+        root = tempfile.mkdtemp(prefix=f"krishisense_bench_{scale}_")
+        print(f"[INFO] {scale}: {n_districts} districts x {n_years} years x {n_crops} crops ({root})")
+        try:
+            started = time.perf_counter()
+            paths = synthetic_data.generate(root, n_districts, n_years, n_crops)
+            print(f"       synthetic data generated in {time.perf_counter() - started:.1f}s")
+            with workspace(root, paths):
+                districts = pd.read_csv(paths['mapping'])
+                for name, setup, func, rows in stages(districts, range(2015, 2015 + n_years)):
+                    row = {'revision': revision, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'scale': scale,
+                           'districts': n_districts, 'years': n_years, 'crops': n_crops, 'stage': name}
+                    row.update(measure(setup, func, rows, memory))
+                    results.append(row)
+                    peak = '' if row['peak_mb'] is None else f"{row['peak_mb']:9.1f} MB"
+                    print(f"       {name:<28}{row['seconds']:9.3f}s {peak}")
+        finally:
+            if not keep:
+                shutil.rmtree(root, ignore_errors=True)
+    return results
+
+def save_results(results, path=None):
+    path = path or RESULTS_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        for row in results:
+            f.write(json.dumps(row) + "\n")
+    print(f"[SUCCESS] {len(results)} results appended to {path}")
+
+def compare(path=None, base=None, head=None):
+    """
+    Stage timings of two revisions side by side (default: the last two revisions recorded).
+    ratio > 1 means head is slower.
+    """
+    path = path or RESULTS_PATH
+    if not os.path.exists(path):
+        print(f"[ERROR] No results at {path}")
+        return None
+    df = pd.read_json(path, lines=True)
+    revisions = list(dict.fromkeys(df['revision']))
+    head = head or revisions[-1]
+    base = base or (revisions[-2] if len(revisions) > 1 else None)
+    if base is None:
+        print("[WARN] Only one revision recorded; nothing to compare.")
+        return None
+
+    # Latest run of each revision / scale / stage
+    latest = df.groupby(['revision', 'scale', 'stage'], sort=False).last().reset_index()
+    pick = lambda rev: latest[latest['revision'] == rev].set_index(['scale', 'stage'])[['seconds', 'peak_mb']]
+    table = pick(base).join(pick(head), lsuffix=f' {base}', rsuffix=f' {head}', how='inner')
+    table['ratio'] = (table[f'seconds {head}'] / table[f'seconds {base}']).round(2)
+    print(table.to_string())
+    return table
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times and memory-profiles the pipeline stages on synthetic data.")
+    parser.add_argument('--scales', nargs='+', default=['small'], choices=list(SCALES))
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc pass (time only)")
+    parser.add_argument('--keep', action='store_true', help="keep the generated synthetic data")
+    parser.add_argument('--compare', nargs='*', metavar='REVISION',
+                        help="compare stored results instead of running: [BASE [HEAD]]")
+    args = parser.parse_args()
+
+    if args.compare is not None:
+        compare(base=args.compare[0] if args.compare else None,
+                head=args.compare[1] if len(args.compare) > 1 else None)
+    else:
+        save_results(run_benchmarks(args.scales, memory=not args.no_memory, keep=args.keep))
@@ -1,80 +1,207 @@
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import os
+import shutil
 import numpy as np
-from src.config import MASTER_DATASET, MODEL_READY_DIR, TARGET_CROPS
+from src.config import MASTER_DATASET, MODEL_READY_DATASET, TARGET_CROPS, CHUNKED_MODE
+from src import agro_features
+from src import schema
+from src import parallel
+from src import spill
+from src import telemetry
 
-def clean_and_split():
+YIELD_COL = 'Yield (Tonne/Hectare)'
+
+# ==========================================
+# SHARD PASSES (each shard holds whole states)
+# ==========================================
+def yield_partials(df):
+    """Pass 1: District+Crop yield sums / counts (district names repeat across states)."""
+    return parallel.partial_means(df, ['District', 'Crop'], YIELD_COL)
+
+def impute_shard(args):
+    """Pass 2: fills yields, drops incomplete rows, returns partials for the global means."""
+    df, district_yield = args
+    # Group by District+Crop and fill NaNs with the mean (combined over every shard)
+    df[YIELD_COL] = df[YIELD_COL].fillna(parallel.lookup_means(district_yield, df, ['District', 'Crop']))
+
+    # Fallback: Group by State+Crop and fill NaNs (a state never spans two shards)
+    df[YIELD_COL] = df[YIELD_COL].fillna(df.groupby(['State', 'Crop'], observed=True)[YIELD_COL].transform('mean'))
+
+    # Drop rows that are still missing critical data (likely no weather data found)
+    df = df.dropna(subset=[YIELD_COL, 'Avg_Temp', 'Total_Rainfall'])
+    return df, parallel.partial_means(df, ['District'], 'Total_Rainfall'), parallel.partial_means(df, ['Crop'], YIELD_COL)
+
+def feature_shard(args):
+    """Pass 3: feature engineering with the global district rain and crop yield means."""
+    df, district_rain, crop_yield = args
+
+    # A. Temp Stress: Deviation from optimal growing temp (approx 25 C)
+    df['Temp_Stress'] = abs(df['Avg_Temp'] - 25.0)
+
+    # B. Rainfall Deviation: Difference between this year's rain and the district's long-term average
+    df['Rain_Deviation'] = df['Total_Rainfall'] - parallel.lookup_means(district_rain, df, ['District']).astype(np.float32)
+
+    # C. Yield Class: Binary Classification for SVM (1 = High Yield, 0 = Low Yield)
+    # Calculated based on whether the yield is above or below the crop's global average
+    df['Yield_Class'] = (df[YIELD_COL] > parallel.lookup_means(crop_yield, df, ['Crop'])).astype(int)
+
+    # D. Daily agro-climatic signal for the row's season window (GDD, dry spells, heavy rain,
+    # heat stress, disease windows); cached, so only recomputed when the weather cube changes
+    return agro_features.attach_features(df)
+
+def clean_and_split(workers=None, chunked=None):
     print("[INFO] Starting Preprocessing Pipeline...")
     
     if not os.path.exists(MASTER_DATASET):
         print(f"[ERROR] Master dataset not found at {MASTER_DATASET}")
         return
+    if CHUNKED_MODE if chunked is None else chunked:
+        return clean_and_split_chunked()
 
-    # 1. Load Master Dataset
-    df = pd.read_csv(MASTER_DATASET)
-    print(f"Original Rows: {len(df)}")
+    # 1. Load Master Dataset (categorical keys, float32 weather)
+    df = schema.read_master(MASTER_DATASET)
+    print(f"Original Rows: {len(df)} ({schema.memory_mb(df):.1f} MB in memory)")
+    telemetry.rows('input', len(df))
 
     # 2. Filter for Target Crops
     # We only keep the crops defined in config.py
     df = df[df['Crop'].isin(TARGET_CROPS.keys())].copy()
+    df['Crop'] = df['Crop'].cat.remove_unused_categories()
     print(f"Filtered Rows (Target Crops): {len(df)}")
+    telemetry.rows('target_crops', len(df))
+
+    # Shards of whole states; means over groups that cross states are combined from partial sums
+    workers = workers or parallel.WORKERS
+    shards = parallel.split_by_state(df, workers)
 
     # 3. Impute Missing Yields
     # Strategy: Use District Average first. If missing, use State Average.
-    print("[INFO] Imputing missing values...")
-    
-    # Group by District+Crop and fill NaNs with the mean
-    df['Yield (Tonne/Hectare)'] = df.groupby(['District', 'Crop'])['Yield (Tonne/Hectare)'].transform(
-        lambda x: x.fillna(x.mean())
-    )
-    
-    # Fallback: Group by State+Crop and fill NaNs
-    df['Yield (Tonne/Hectare)'] = df.groupby(['State', 'Crop'])['Yield (Tonne/Hectare)'].transform(
-        lambda x: x.fillna(x.mean())
-    )
-    
-    # Drop rows that are still missing critical data (likely no weather data found)
-    df = df.dropna(subset=['Yield (Tonne/Hectare)', 'Avg_Temp', 'Total_Rainfall'])
+    print(f"[INFO] Imputing missing values ({len(shards)} shard(s))...")
+    district_yield = parallel.combine_means(parallel.map_shards(yield_partials, shards, workers))
+    results = parallel.map_shards(impute_shard, [(shard, district_yield) for shard in shards], workers)
+    shards = [shard for shard, _, _ in results]
+    district_rain = parallel.combine_means([rain for _, rain, _ in results])
+    crop_yield = parallel.combine_means([crop for _, _, crop in results])
 
     # 4. Feature Engineering (Adding Intelligence)
     print("[INFO] Engineering Features...")
-    
-    # A. Temp Stress: Deviation from optimal growing temp (approx 25 C)
-    df['Temp_Stress'] = abs(df['Avg_Temp'] - 25.0)
-    
-    # B. Rainfall Deviation: Difference between this year's rain and the district's long-term average
-    district_rain_mean = df.groupby('District')['Total_Rainfall'].transform('mean')
-    df['Rain_Deviation'] = df['Total_Rainfall'] - district_rain_mean
-    
-    # C. Yield Class: Binary Classification for SVM (1 = High Yield, 0 = Low Yield)
-    # Calculated based on whether the yield is above or below the crop's global average
-    crop_mean_yield = df.groupby('Crop')['Yield (Tonne/Hectare)'].transform('mean')
-    df['Yield_Class'] = (df['Yield (Tonne/Hectare)'] > crop_mean_yield).astype(int)
+    agro_features.load_features()  # refresh the feature cache once, before workers read it
+    shards = parallel.map_shards(feature_shard, [(shard, district_rain, crop_yield) for shard in shards], workers)
 
-    # 5. Split and Save specific datasets
-    os.makedirs(MODEL_READY_DIR, exist_ok=True)
-    
-    # Dataset A: Sugarcane (For Regression, Clustering, SVM)
-    sugar_df = df[df['Crop'] == 'Sugarcane']
-    sugar_path = os.path.join(MODEL_READY_DIR, "sugarcane_modeling.csv")
-    sugar_df.to_csv(sugar_path, index=False)
-    print(f"Saved Sugarcane Data: {len(sugar_df)} rows")
-    
-    # Dataset B: Spices (For Association Rules)
-    # Extract keys from config where value is 'spice'
-    spices = [k for k, v in TARGET_CROPS.items() if v == 'spice']
-    spice_df = df[df['Crop'].isin(spices)]
-    spice_path = os.path.join(MODEL_READY_DIR, "spices_modeling.csv")
-    spice_df.to_csv(spice_path, index=False)
-    print(f"Saved Spices Data: {len(spice_df)} rows")
-    
-    # Dataset C: Horticulture (For Price Prediction reference/future use)
-    veg_df = df[df['Crop'].isin(['Onion', 'Potato'])]
-    veg_path = os.path.join(MODEL_READY_DIR, "horticulture_modeling.csv")
-    veg_df.to_csv(veg_path, index=False)
-    print(f"Saved Horticulture Data: {len(veg_df)} rows")
+    # Deterministic combine: back to the master dataset's row order
+    df = pd.concat(shards).sort_index()
+
+    # 5. Save every target crop in one pass, partitioned by Category / Crop (from TARGET_CROPS)
+    df['Category'] = df['Crop'].map(TARGET_CROPS)
+    write_partitioned(df)
+    telemetry.rows('output', len(df))
+    for category, rows in df.groupby('Category', sort=False, observed=True).size().items():
+        print(f"Saved {category} data: {rows} rows")
+
+    print(f"\n[SUCCESS] Datasets saved to {MODEL_READY_DATASET}")
+
+def clean_and_split_chunked():
+    """
+    Out-of-core preprocessing (config.CHUNKED_MODE): the master CSV is read in chunks sized to
+    MEMORY_LIMIT_MB and target-crop rows are spilled per State. The same three passes as the
+    sharded mode then run one State at a time, with global means built from running partial sums.
+    """
+    sample = schema.read_master(MASTER_DATASET, nrows=1000)
+    chunk_rows = spill.rows_within(sample)
+
+    # 1. Stream the master dataset: filter target crops, District+Crop yield partials, spill by State
+    print(f"[INFO] Chunked mode: reading {MASTER_DATASET} in chunks of {chunk_rows} rows...")
+    states = spill.Spill('split_filtered')
+    total_rows, kept_rows, district_yield = 0, 0, None
+    for chunk in schema.read_master(MASTER_DATASET, chunksize=chunk_rows):
+        total_rows += len(chunk)
+        chunk = chunk[chunk['Crop'].isin(TARGET_CROPS.keys())]
+        kept_rows += len(chunk)
+        district_yield = parallel.add_partials(district_yield, yield_partials(chunk))
+        for state, rows in chunk.groupby('State', sort=False, observed=True):
+            states.append(state, rows)
+    print(f"Original Rows: {total_rows}")
+    print(f"Filtered Rows (Target Crops): {kept_rows}")
+    telemetry.rows('input', total_rows)
+    telemetry.rows('target_crops', kept_rows)
+    if district_yield is None:
+        states.clear()
+        return
+    district_yield = parallel.combine_means([district_yield])
+
+    # 2. Impute Missing Yields per State (District average first, then State average)
+    print("[INFO] Imputing missing values...")
+    imputed = spill.Spill('split_imputed')
+    district_rain, crop_yield = None, None
+    for state in states.keys():
+        df, rain, crop = impute_shard((schema.apply_schema(states.read(state)), district_yield))
+        imputed.append(state, df)
+        district_rain = parallel.add_partials(district_rain, rain)
+        crop_yield = parallel.add_partials(crop_yield, crop)
+    states.clear()
+    district_rain = parallel.combine_means([district_rain])
+    crop_yield = parallel.combine_means([crop_yield])
+
+    # 3. Feature Engineering, then each State is written as its own part of the dataset
+    print("[INFO] Engineering Features...")
+    agro_features.load_features()
+    counts = {}
+
+    def featured():
+        for state in imputed.keys():
+            df = feature_shard((schema.apply_schema(imputed.read(state)), district_rain, crop_yield))
+            df['Category'] = df['Crop'].astype(str).map(TARGET_CROPS)
+            for category, rows in df.groupby('Category', sort=False).size().items():
+                counts[category] = counts.get(category, 0) + rows
+            yield schema.apply_schema(df)
+
+    write_partitioned(featured())
+    imputed.clear()
+    telemetry.rows('output', sum(counts.values()))
+    for category, rows in counts.items():
+        print(f"Saved {category} data: {rows} rows")
+
+    print(f"\n[SUCCESS] Datasets saved to {MODEL_READY_DATASET}")
+
+def write_partitioned(frames, root=None):
+    """
+    Writes a DataFrame (or an iterable of DataFrames, one part file each) as a Parquet dataset
+    under root: Category=<category>/Crop=<crop>/*.parquet.
+    Built in a temporary folder and swapped in, so readers never see a half-written dataset.
+    """
+    root = root or MODEL_READY_DATASET
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
+    tmp_root = root + ".tmp"
+    if os.path.exists(tmp_root):
+        shutil.rmtree(tmp_root)
+    for n, df in enumerate(frames):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        # Plain strings on disk: categories differ between parts (Parquet dictionary-encodes anyway)
+        fields = [pa.field(f.name, f.type.value_type) if pa.types.is_dictionary(f.type) else f for f in table.schema]
+        table = table.cast(pa.schema(fields, metadata=table.schema.metadata))
+        pq.write_to_dataset(table, tmp_root, partition_cols=['Category', 'Crop'],
+                            basename_template=f'part-{n}-{{i}}.parquet')
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    os.replace(tmp_root, root)
 
-    print(f"\n[SUCCESS] Datasets saved to {MODEL_READY_DIR}")
+def load_model_ready(crops=None, category=None, columns=None, root=None):
+    """
+    Reads only the partitions needed, e.g. load_model_ready(crops=['Sugarcane'])
+    or load_model_ready(category='spice', columns=['District', 'Year', 'Yield (Tonne/Hectare)']).
+    Unrequested columns are never read from disk.
+    """
+    root = root or MODEL_READY_DATASET
+    filters = []
+    if category is not None:
+        filters.append(('Category', '==', category))
+    if crops is not None:
+        filters.append(('Crop', 'in', list(crops)))
+    df = pd.read_parquet(root, columns=columns, filters=filters or None)
+    return schema.apply_schema(df)
 
 if __name__ == "__main__":
     clean_and_split()
\ No newline at end of file
@@ -14,12 +14,73 @@ MODEL_READY_DIR = os.path.join(PROCESSED_DIR, "model_ready")
 RAW_CROP_DATA = os.path.join(RAW_DIR, "gov_crop_data", "crop_production_2015_2023.xls")
 DISTRICT_MAPPING = os.path.join(INTERIM_DIR, "district_mapping.csv")
 WEATHER_DATA_DIR = os.path.join(RAW_DIR, "nasa_weather")
+WEATHER_CELL_DIR = os.path.join(WEATHER_DATA_DIR, "cells")
+WEATHER_LINKS = os.path.join(INTERIM_DIR, "weather_links.csv")
 MASTER_DATASET = os.path.join(PROCESSED_DIR, "KrishiSense_Master_Dataset.csv")
+MODEL_READY_DATASET = os.path.join(MODEL_READY_DIR, "crops")  # Parquet, Category=/Crop= partitions
+WEATHER_MANIFEST = os.path.join(INTERIM_DIR, "weather_manifest.json")
+CROP_CACHE_DIR = os.path.join(INTERIM_DIR, "cache")
+GEOCODE_CACHE = os.path.join(INTERIM_DIR, "geocode_cache.sqlite")
+GAZETTEER = os.path.join(RAW_DIR, "gazetteer", "india_districts.csv")
+PIPELINE_STATE = os.path.join(INTERIM_DIR, "pipeline_state.json")
 
 # Analysis Configuration
 SEASON_START_MONTH = 1
 SEASON_END_MONTH = 12
 
+AGRI_YEAR_MONTHS = (7, 6)  # July - June agricultural year
+
+# Weather window per crop season: (start month, end month) counted from the crop year.
+# An end month before the start month runs into the next calendar year,
+# e.g. Rabi "2015-16" = Oct 2015 - Mar 2016. Unknown seasons use 'Whole Year'.
+SEASON_WINDOWS = {
+    'Kharif': (6, 10),
+    'Rabi': (10, 3),
+    'Summer': (3, 6),
+    'Autumn': (8, 11),
+    'Winter': (11, 2),
+    'Whole Year': (SEASON_START_MONTH, SEASON_END_MONTH),
+    'Agricultural Year': AGRI_YEAR_MONTHS
+}
+
+# Rows per batch when streaming the government crop export
+CROP_BATCH_ROWS = 2000
+
+# Processes for merge / preprocessing. Above 1 the work is sharded by State
+# (e.g. os.cpu_count() on a multi-core box)
+PARALLEL_WORKERS = 1
+
+# Out-of-core mode for tables larger than RAM (e.g. block / tehsil-level crop data):
+# stages work in bounded batches and spill per-state intermediates to SPILL_DIR
+CHUNKED_MODE = False
+MEMORY_LIMIT_MB = 1024     # rows buffered in memory before they are spilled to disk
+SPILL_DIR = os.path.join(INTERIM_DIR, "spill")
+
+# Stage metrics (src/telemetry.py): one JSON line per stage run with time, CPU, peak RSS,
+# row counts and cache hit rates. Off by default; run_pipeline.py --metrics turns it on
+METRICS_ENABLED = False
+METRICS_LOG = os.path.join(INTERIM_DIR, "metrics.jsonl")
+PROFILE_DIR = os.path.join(INTERIM_DIR, "profiles")  # cProfile dumps (--profile)
+
+# NASA POWER Download Window & Throttling
+WEATHER_START_YEAR = 2015
+WEATHER_END_YEAR = 2023
+FETCH_WORKERS = 8          # Parallel HTTP workers
+FETCH_RATE_PER_SEC = 4.0   # Token bucket refill rate (requests / second)
+FETCH_BURST = 4            # Token bucket size
+FETCH_MAX_RETRIES = 4      # Attempts per district before marking it failed
+
+# Geocoding providers used by the batch resolver: (name, min seconds between calls)
+GEOCODERS = [
+    ('nominatim', 1.0),
+    ('photon', 1.0),
+    ('arcgis', 0.5)
+]
+
+# NASA POWER meteorology grid (MERRA-2: 0.5 deg latitude x 0.625 deg longitude)
+WEATHER_GRID_LAT = 0.5
+WEATHER_GRID_LON = 0.625
+
 # Target Crops for Modeling (The Risk Trinity)
 TARGET_CROPS = {
     'Sugarcane': 'cash_crop',
@@ -29,4 +90,36 @@ TARGET_CROPS = {
     'Ginger': 'spice',
     'Dry chillies': 'spice',
     'Garlic': 'spice'
-}
\ No newline at end of file
+}
+
+# Packed Weather Cube (district x day x variable, float32 memmap)
+WEATHER_CUBE = os.path.join(INTERIM_DIR, "weather_cube.npy")
+WEATHER_CUBE_INDEX = os.path.join(INTERIM_DIR, "weather_cube_index.json")
+WEATHER_VARIABLES = ['T2M', 'Rain', 'Humidity']
+WEATHER_FILL_VALUE = -999   # NASA POWER "no data" marker; read as missing everywhere
+
+# Weather coverage audit (src/audit_weather.py): per district and year, days present,
+# fill values and coverage. The merge skips district-years marked 'bad'
+WEATHER_AUDIT = os.path.join(INTERIM_DIR, "weather_audit.csv")
+AUDIT_MIN_COVERAGE = 0.9    # share of a year's days that must hold real values
+
+# Yearly weather aggregates per weather file (refreshed incrementally)
+WEATHER_ANNUAL = os.path.join(INTERIM_DIR, "weather_annual.csv")
+
+# Daily agro-climatic features per district-season (src/agro_features.py)
+AGRO_FEATURES = os.path.join(INTERIM_DIR, "agro_features.parquet")
+GDD_BASE_TEMP = 10.0          # deg C, base temperature for growing degree days
+DRY_DAY_RAIN_MM = 1.0         # a day with less rain than this is dry
+HEAVY_RAIN_MM = 64.5          # IMD "heavy rain" threshold (mm/day)
+HEAT_STRESS_TEMP = 32.0       # daily mean T2M above this is a heat-stress day
+DISEASE_HUMIDITY = 85.0       # RH % at or above which fungal disease risk rises
+DISEASE_TEMP_RANGE = (15.0, 30.0)
+DISEASE_MIN_DAYS = 3          # consecutive humid + mild days that make one disease window
+
+# Benchmarks (src/benchmark.py): synthetic scales as (districts, years, crops)
+BENCHMARK_RESULTS = os.path.join(BASE_DIR, "benchmarks", "results.jsonl")
+BENCHMARK_SCALES = {
+    'small': (50, 3, 5),
+    'medium': (200, 5, 10),
+    'large': (600, 8, 25)
+}
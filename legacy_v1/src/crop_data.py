@@ -0,0 +1,235 @@
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from lxml import etree
+import hashlib
+import json
+import os
+import re
+from src.config import RAW_CROP_DATA, CROP_CACHE_DIR, CROP_BATCH_ROWS
+from src import schema
+from src import telemetry
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+CROP_DATA_PATH = RAW_CROP_DATA
+CACHE_DIR = CROP_CACHE_DIR
+BATCH_ROWS = CROP_BATCH_ROWS
+ID_COLUMNS = ['State', 'District', 'Year']
+# Bump PARSER_VERSION when the cell parsing changes so cached tables are re-parsed
+PARSER_VERSION = 2
+
+# Same whitespace rule as pandas.read_html
+WHITESPACE = re.compile(r"[\r\n]+|\s{2,}")
+
+# ==========================================
+# CLEANING
+# ==========================================
+def clean_crop_table(df):
+    """
+    Shared cleaning for the government table:
+    - first three columns renamed to State, District, Year
+    - "1. " prefixes removed from State and District
+    - Year reduced to its first 4 digits ("2015-16" -> 2015)
+    Crop columns keep their (Crop, Season, Metric) header as a string.
+    """
+    # 1. Rename Columns by Index
+    new_columns = [str(c) for c in df.columns]
+    new_columns[0] = 'State'
+    new_columns[1] = 'District'
+    new_columns[2] = 'Year'
+    df.columns = new_columns
+
+    # 2. Clean Names (Remove "1. ")
+    df['State'] = df['State'].astype(str).str.strip().str.replace(r'^\d+\.\s*', '', regex=True)
+    df['District'] = df['District'].astype(str).str.strip().str.replace(r'^\d+\.\s*', '', regex=True)
+
+    # 3. Clean Year (Extract 2015 from "2015-16")
+    df['Year'] = df['Year'].astype(str).str.extract(r'(\d{4})').astype(float).astype(int)
+
+    # 4. Crop figures stay float64 in every batch (exact source values, one Parquet schema)
+    for col in df.columns[3:]:
+        if df[col].dtype == object:
+            df[col] = pd.to_numeric(df[col].str.replace(',', '', regex=False), errors='coerce')
+        df[col] = df[col].astype(schema.SOURCE_DTYPE)
+    return df
+
+# ==========================================
+# STREAMING HTML READER
+# ==========================================
+def iter_html_rows(file_path):
+    """
+    Yields (is_header, [cell texts]) for every <tr>, one row at a time.
+    rowspan / colspan are expanded the same way pandas.read_html does. Each row is
+    cleared from the tree once read, so memory doesn't grow with the file.
+    """
+    remainder = []  # (column index, text, rows left) carried down by rowspan
+    seen_body = False
+
+    for _, tr in etree.iterparse(file_path, events=('end',), tag='tr', html=True, recover=True):
+        cells = [c for c in tr if c.tag in ('td', 'th')]
+        parent = tr.getparent()
+        is_header = (parent is not None and parent.tag == 'thead') or \
+                    (not seen_body and bool(cells) and all(c.tag == 'th' for c in cells))
+        seen_body = seen_body or not is_header
+
+        texts, next_remainder, index = [], [], 0
+        for cell in cells:
+            while remainder and remainder[0][0] <= index:
+                prev_i, prev_text, prev_rows = remainder.pop(0)
+                texts.append(prev_text)
+                if prev_rows > 1:
+                    next_remainder.append((prev_i, prev_text, prev_rows - 1))
+                index += 1
+
+            raw = (cell.text or '') if len(cell) == 0 else ''.join(cell.itertext())
+            text = WHITESPACE.sub(' ', raw).strip()
+            rowspan = int(cell.get('rowspan') or 1)
+            colspan = int(cell.get('colspan') or 1)
+            for _ in range(colspan):
+                texts.append(text)
+                if rowspan > 1:
+                    next_remainder.append((index, text, rowspan - 1))
+                index += 1
+
+        for prev_i, prev_text, prev_rows in remainder:
+            texts.append(prev_text)
+            if prev_rows > 1:
+                next_remainder.append((prev_i, prev_text, prev_rows - 1))
+        remainder = next_remainder
+
+        # Free the row and everything parsed before it
+        tr.clear()
+        while parent is not None and tr.getprevious() is not None:
+            del parent[0]
+
+        if texts:
+            yield is_header, texts
+
+def header_columns(header_rows):
+    """Column labels from the header rows: a string for one row, a tuple per column otherwise."""
+    if len(header_rows) == 1:
+        return list(header_rows[0])
+    columns = []
+    for i, levels in enumerate(zip(*header_rows)):
+        columns.append(tuple(text if text else f"Unnamed: {i}_level_{lvl}" for lvl, text in enumerate(levels)))
+    return columns
+
+def stream_crop_html(file_path, batch_size=None):
+    """Parses the HTML table disguised as .xls into cleaned DataFrame batches."""
+    batch_size = batch_size or BATCH_ROWS
+    header_rows, columns, rows = [], None, []
+
+    for is_header, texts in iter_html_rows(file_path):
+        if is_header and columns is None:
+            header_rows.append(texts)
+            continue
+        if columns is None:
+            if not header_rows:
+                raise ValueError("No header row found.")
+            columns = header_columns(header_rows)
+        rows.append(texts[:len(columns)] + [''] * (len(columns) - len(texts)))
+        if len(rows) >= batch_size:
+            yield to_batch(rows, columns)
+            rows = []
+
+    if columns is None:
+        raise ValueError("No data tables found.")
+    if rows:
+        yield to_batch(rows, columns)
+
+def to_batch(rows, columns):
+    df = pd.DataFrame(rows, columns=range(len(columns)))
+    df = df.where(df != '', np.nan)
+    df.columns = pd.Index(columns, tupleize_cols=False)
+    return clean_crop_table(df)
+
+# ==========================================
+# CACHE
+# ==========================================
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cache_paths(file_path):
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(CACHE_DIR, f"{name}.parquet"), os.path.join(CACHE_DIR, f"{name}.json")
+
+def write_meta(file_path, meta_path, digest):
+    stat = os.stat(file_path)
+    with open(meta_path, 'w') as f:
+        json.dump({'source': file_path, 'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': digest,
+                   'schema': schema.SCHEMA_VERSION, 'parser': PARSER_VERSION}, f)
+
+def cached_table(file_path):
+    """
+    Path of a valid Parquet cache for file_path, or None.
+    Valid while the source's size + mtime match; if they changed but the SHA-256 is the
+    same (e.g. the file was copied), the cache is kept and its sidecar refreshed.
+    """
+    table_path, meta_path = cache_paths(file_path)
+    if not (os.path.exists(table_path) and os.path.exists(meta_path)):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    if meta.get('schema') != schema.SCHEMA_VERSION or meta.get('parser') != PARSER_VERSION:
+        return None
+    stat = os.stat(file_path)
+    if meta.get('size') == stat.st_size and meta.get('mtime') == stat.st_mtime:
+        return table_path
+    digest = file_sha256(file_path)
+    if meta.get('sha256') == digest:
+        write_meta(file_path, meta_path, digest)
+        return table_path
+    return None
+
+def iter_crop_batches(file_path=None, batch_size=None, use_cache=True):
+    """
+    Cleaned government crop table in batches of at most batch_size rows.
+    Read from the Parquet cache when it is valid. Otherwise the HTML is streamed and the
+    cache is written batch by batch, so peak memory is about one batch either way.
+    """
+    file_path = file_path or CROP_DATA_PATH
+    batch_size = batch_size or BATCH_ROWS
+
+    table_path = cached_table(file_path) if use_cache else None
+    telemetry.count('crop_cache.hit' if table_path else 'crop_cache.miss')
+    if table_path:
+        for batch in pq.ParquetFile(table_path).iter_batches(batch_size=batch_size):
+            yield batch.to_pandas()
+        return
+
+    print(f"[INFO] Parsing {os.path.basename(file_path)} (cached after the first run)...")
+    table_path, meta_path = cache_paths(file_path)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = table_path + ".tmp"
+    writer = None
+    try:
+        for batch in stream_crop_html(file_path, batch_size):
+            table = pa.Table.from_pandas(batch, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table)
+            yield batch
+    except BaseException:
+        # Stopped early or failed: never leave a partial cache behind
+        if writer is not None:
+            writer.close()
+            os.remove(tmp_path)
+        raise
+    if writer is not None:
+        writer.close()
+        os.replace(tmp_path, table_path)
+        write_meta(file_path, meta_path, file_sha256(file_path))
+
+def load_crop_table(file_path=None, use_cache=True):
+    """Whole cleaned crop table (see iter_crop_batches). Returns None if the source is missing."""
+    file_path = file_path or CROP_DATA_PATH
+    if not os.path.exists(file_path):
+        return None
+    return pd.concat(iter_crop_batches(file_path, use_cache=use_cache), ignore_index=True)
@@ -1,9 +1,16 @@
 import pandas as pd
+import numpy as np
 import os
-from tqdm import tqdm
 
 
-from src.config import RAW_CROP_DATA, WEATHER_DATA_DIR,MASTER_DATASET
+from src.config import RAW_CROP_DATA, WEATHER_DATA_DIR,MASTER_DATASET, CHUNKED_MODE
+from src import weather_cube
+from src import crop_data
+from src import schema
+from src import parallel
+from src import spill
+from src import telemetry
+from src import audit_weather
 # ==========================================
 # CONFIGURATION
 # ==========================================
@@ -11,28 +18,18 @@ CROP_DATA_PATH = RAW_CROP_DATA
 WEATHER_DIR = WEATHER_DATA_DIR
 OUTPUT_PATH = MASTER_DATASET
 
+# Daily series already read by get_annual_weather, by weather key
+WEATHER_CACHE = {}
+# Cube and weather_key -> file map behind get_annual_weather, loaded on first use
+_weather_state = {}
+
 def load_gov_data():
     print("[INFO] Loading Government Crop Data...")
     if not os.path.exists(CROP_DATA_PATH): return None
 
     try:
-        # 1. Load Data
-        dfs = pd.read_html(CROP_DATA_PATH)
-        df = dfs[0]
-        
-        # 2.  Rename Columns by Index
-        new_columns = list(df.columns)
-        new_columns[0] = 'State'
-        new_columns[1] = 'District'
-        new_columns[2] = 'Year'
-        df.columns = new_columns
-        
-        # 3. Clean Names (Remove "1. ")
-        df['State'] = df['State'].astype(str).str.strip().str.replace(r'^\d+\.\s*', '', regex=True)
-        df['District'] = df['District'].astype(str).str.strip().str.replace(r'^\d+\.\s*', '', regex=True)
-        
-        # 4. Clean Year (Extract 2015 from "2015-16")
-        df['Year'] = df['Year'].astype(str).str.extract(r'(\d{4})').astype(float).astype(int)
+        # Parsed + cleaned once, then served from the Parquet cache
+        df = crop_data.load_crop_table(CROP_DATA_PATH)
         
         print(f"[SUCCESS] Data loaded. Shape: {df.shape}")
         return df
@@ -41,29 +38,44 @@ def load_gov_data():
         print(f"[ERROR] Data load failed: {e}")
         return None
 
-def get_annual_weather(district, state, year, cache={}):
-    # Filename
+def clear_weather_cache():
+    """Forgets the daily series get_annual_weather has read (e.g. after the weather files changed)."""
+    WEATHER_CACHE.clear()
+    _weather_state.clear()
+
+def weather_state():
+    """
+    (cube or None, {weather_key: file}) for get_annual_weather, loaded once per process instead of
+    on every cache miss. A cube older than the weather files is not used (the CSVs are newer).
+    """
+    if not _weather_state:
+        sources = weather_cube.weather_sources(WEATHER_DIR)
+        _weather_state['sources'] = sources
+        _weather_state['cube'] = weather_cube.load_cube(weather_dir=WEATHER_DIR, sources=sources)
+    return _weather_state['cube'], _weather_state['sources']
+
+def get_annual_weather(district, state, year, cache=WEATHER_CACHE):
+    # Weather key (also the legacy file name)
     safe_name = f"{district}_{state}".replace(" ", "_").lower()
-    file_path = os.path.join(WEATHER_DIR, f"{safe_name}.csv")
-    
-    if not os.path.exists(file_path):
-        return None, None, None
 
     # Cache optimization
-    if file_path not in cache:
-        try:
-            df = pd.read_csv(file_path)
-            
-        
-            # Convert integer 20150101 -> String "20150101" -> Datetime
-            df['Date'] = pd.to_datetime(df.iloc[:, 0].astype(str), format='%Y%m%d')
-            
-            cache[file_path] = df
-        except:
-            cache[file_path] = None
+    telemetry.count('weather_series.hit' if safe_name in cache else 'weather_series.miss')
+    if safe_name not in cache:
+        # Packed cube first (zero-copy slice), raw CSV as fallback
+        cube, sources = weather_state()
+        file_path = sources.get(safe_name)
+        if cube is not None and safe_name in cube:
+            cache[safe_name] = cube.to_frame(safe_name)
+        elif file_path is None:
             return None, None, None
+        else:
+            try:
+                cache[safe_name] = weather_cube.read_weather_csv(file_path)
+            except:
+                cache[safe_name] = None
+                return None, None, None
     
-    df = cache[file_path]
+    df = cache[safe_name]
     if df is None: return None, None, None
 
     # Filter for Year
@@ -76,64 +88,304 @@ def get_annual_weather(district, state, year, cache={}):
     # Calculate Metrics
     return yearly_data['T2M'].mean(), yearly_data['Rain'].sum(), yearly_data['Humidity'].mean()
 
-def merge_data():
-    # 1. Load Data
-    crop_df = load_gov_data()
-    if crop_df is None: return
+def load_annual_weather(keys=None):
+    """
+    Yearly weather table for the merge.
+    Returns one row per (Weather_Key, Year) with Avg_Temp, Total_Rainfall, Avg_Humidity.
+    Weather_Key is the safe district name ("pune_maharashtra"); it is resolved to its grid-cell
+    file (or legacy per-district file). Pass keys to only touch the files those districts need.
+    Yearly values come from the persisted weather_annual.csv, so only files whose content changed
+    since the last run are re-read (only the new years when the fetcher appended a tail).
+    """
+    annual, files, refreshed = annual_weather_for(keys)
+    if refreshed:
+        print(f"[INFO] Recomputed yearly weather for {refreshed} of {files['Source'].nunique()} files.")
+        weather_cube.store_annual_table(files)
+    return annual
+
+def annual_weather_for(keys=None):
+    """
+    load_annual_weather without writing anything (safe inside worker processes).
+    Returns (table per Weather_Key, table per weather file, number of files recomputed).
+    """
+    sources = weather_cube.weather_sources(WEATHER_DIR)
+    if keys is None:
+        keys = list(sources)
+    links = pd.DataFrame({'Weather_Key': sorted(set(keys))})
+    links['Source'] = links['Weather_Key'].map(sources)
+    links = links.dropna(subset=['Source'])
+
+    # Each file is aggregated once, even when several districts share its grid cell
+    files, refreshed = weather_cube.annual_for_files(links['Source'].unique(), WEATHER_DIR)
+    links['Source'] = [os.path.relpath(p, WEATHER_DIR) for p in links['Source']]
+    annual = links.merge(files, on='Source')
+    return annual[['Weather_Key', 'Year', 'Avg_Temp', 'Total_Rainfall', 'Avg_Humidity']], files, refreshed
+
+def load_season_weather(keys, starts, ends):
+    """
+    Weather of arbitrary date windows, one row per (key, start, end) in the order given.
+    Served from the cube's prefix sums (rebuilt if missing or older than the weather files):
+    O(1) per row. Partial marks windows cut short at the last day of the cube.
+    """
+    cube = weather_cube.load_cube(weather_dir=WEATHER_DIR)
+    if cube is None:
+        cube = weather_cube.build_cube(WEATHER_DIR)
+    if cube is None:
+        table = pd.DataFrame(np.nan, index=range(len(keys)), columns=['Avg_Temp', 'Total_Rainfall', 'Avg_Humidity'])
+        table['Partial'] = False
+        return table
+    return cube.window_table(keys, starts, ends)
+
+def season_windows(base_df):
+    """
+    Weather window of every row from its Season (config.SEASON_WINDOWS).
+    Returns (starts, ends, calendar) where calendar marks plain calendar-year windows.
+    """
+    starts, ends = weather_cube.season_bounds(base_df['Season'], base_df['Year'])
+    year = (base_df['Year'].values - 1970).astype('datetime64[Y]')
+    calendar = (starts == year.astype('datetime64[D]')) & (ends == (year + 1).astype('datetime64[D]') - 1)
+    return starts, ends, calendar
 
-    # 2. Melt (Wide -> Long)
-    print("[INFO] Melting dataset...")
+def merge_weather_shard(base_df):
+    """
+    Attaches Avg_Temp / Total_Rainfall / Avg_Humidity to one shard of crop rows (whole states),
+    reading only the weather files of the shard's districts. Writes nothing, so shards can run
+    in parallel processes. Returns (rows with weather, yearly table per file, files recomputed).
+    Partial_Weather marks rows whose season runs past the last day of the weather data
+    (their weather covers the days up to it); it is kept in the master for modelling.
+    """
+    # Calendar-year windows use the incremental yearly table; every other window is one
+    # prefix-sum lookup in the cube
+    weather_cols = ['Avg_Temp', 'Total_Rainfall', 'Avg_Humidity']
+    starts, ends, calendar = season_windows(base_df)
+
+    files, refreshed = pd.DataFrame(columns=weather_cube.ANNUAL_COLUMNS), 0
+    if calendar.any():
+        annual_df, files, refreshed = annual_weather_for(base_df.loc[calendar, 'Weather_Key'].unique())
+        merged = base_df.merge(annual_df, on=['Weather_Key', 'Year'], how='left')
+        merged.index = base_df.index
+        base_df = merged
+    else:
+        base_df = base_df.copy()
+        base_df[weather_cols] = np.nan
+    if not calendar.all():
+        seasonal = load_season_weather(base_df['Weather_Key'].values[~calendar], starts[~calendar], ends[~calendar])
+        base_df.loc[~calendar, weather_cols] = seasonal[weather_cols].values
+    base_df['Partial_Weather'] = False
+    if not calendar.all():
+        base_df.loc[~calendar, 'Partial_Weather'] = seasonal['Partial'].values
+    return base_df, files, refreshed
+
+def parse_crop_info(val, index):
+    # Header like "('Sugarcane', 'Whole Year', 'Yield (Tonne/Hectare)')" -> part by index
+    s = str(val)
+    if "'" in s:
+        parts = s.split("'")
+        if len(parts) > index: return parts[index]
+    return "Unknown"
+
+def decode_crop_header(columns):
+    """
+    Decodes every crop column header once into a (Crop, Season, Metric) MultiIndex.
+    """
+    return pd.MultiIndex.from_tuples(
+        [(parse_crop_info(c, 1), parse_crop_info(c, 3), parse_crop_info(c, -2)) for c in columns],
+        names=['Crop', 'Season', 'Metric']
+    )
+
+def reshape_crop_batch(crop_df):
+    """
+    Wide government rows -> one row per (State, District, Year, Crop, Season)
+    with one column per Metric. A key repeated in the batch comes out once per source row;
+    the caller's groupby(keys).first() collapses them, as pivot_table(aggfunc='first') would.
+    """
     id_vars = ['State', 'District', 'Year']
-    value_vars = [c for c in crop_df.columns if c not in id_vars]
-    
-    melted_df = pd.melt(crop_df, id_vars=id_vars, value_vars=value_vars, 
-                        var_name='Crop_Info', value_name='Value')
-    
-    # 3. Parse Crop Details
-    print("[INFO] Parsing crop details...")
-    def parse_crop_info(val, index):
-        s = str(val)
-        if "'" in s:
-            parts = s.split("'")
-            if len(parts) > index: return parts[index]
-        return "Unknown"
-
-    melted_df['Crop'] = melted_df['Crop_Info'].apply(lambda x: parse_crop_info(x, 1))
-    melted_df['Season'] = melted_df['Crop_Info'].apply(lambda x: parse_crop_info(x, 3))
-    melted_df['Metric'] = melted_df['Crop_Info'].apply(lambda x: parse_crop_info(x, -2))
-    
-    # 4. Pivot
-    print("[INFO] Pivoting...")
-    base_df = melted_df.pivot_table(index=['State', 'District', 'Year', 'Crop', 'Season'], 
-                                    columns='Metric', values='Value', aggfunc='first').reset_index()
+
+    # Headers are decoded per column, never per cell
+    wide = crop_df.set_index(id_vars)
+    wide.columns = decode_crop_header(wide.columns)
+
+    # Repeated headers: keep the first non-null value, like aggfunc='first'
+    if wide.columns.duplicated().any():
+        wide = wide.T.groupby(level=['Crop', 'Season', 'Metric'], sort=False).first().T
+
+    # Move Crop and Season into the row index; Metric stays as columns
+    base_df = wide.stack(['Crop', 'Season'], future_stack=True)
+    base_df = base_df.dropna(how='all').dropna(axis=1, how='all')
+    base_df = base_df[sorted(base_df.columns)].sort_index().reset_index()
     base_df.columns.name = None
+    return base_df
+
+def skip_bad_weather(base_df, bad):
+    """
+    Blanks the weather of district-years the last weather audit graded 'bad' (too few real days;
+    bad = audit_weather.bad_years()), so they drop out like rows without weather.
+    Returns the number of rows affected.
+    """
+    if bad.empty:
+        return 0
+    rows = pd.MultiIndex.from_arrays([base_df['Weather_Key'], base_df['Year'].astype(int)])
+    hit = rows.isin(pd.MultiIndex.from_frame(bad))
+    base_df.loc[hit, ['Avg_Temp', 'Total_Rainfall', 'Avg_Humidity']] = np.nan
+    return int(hit.sum())
+
+def merge_data(workers=None, chunked=None):
+    # 1. Stream the government table in batches straight into melt / parse / pivot
+    print("[INFO] Loading Government Crop Data...")
+    if not os.path.exists(CROP_DATA_PATH): return
+    if CHUNKED_MODE if chunked is None else chunked:
+        return merge_data_chunked()
+
+    print("[INFO] Melting, parsing crop details and pivoting in batches...")
+    crop_rows, pieces = 0, []
+    try:
+        for batch in crop_data.iter_crop_batches(CROP_DATA_PATH):
+            crop_rows += len(batch)
+            pieces.append(reshape_crop_batch(batch))
+    except Exception as e:
+        print(f"[ERROR] Data load failed: {e}")
+        return
+    if not pieces: return
+
+    # Same result as one pivot over the whole table: first non-null value per key (repeated
+    # keys within a batch as well as across batches), sorted keys, metric columns in sorted order
+    keys = ['State', 'District', 'Year', 'Crop', 'Season']
+    base_df = pd.concat(pieces, ignore_index=True)
+    base_df = base_df.groupby(keys, sort=True).first().reset_index()
+    metrics = sorted(c for c in base_df.columns if c not in keys)
+    base_df = base_df[keys + metrics]
     
     # 5. Merge Weather
-    print(f"[INFO] Merging Weather Data for {len(base_df)} rows...")
-    temps, rains, humids = [], [], []
-    
-    # Use tqdm to show progress
-    for index, row in tqdm(base_df.iterrows(), total=len(base_df)):
-        t, r, h = get_annual_weather(row['District'], row['State'], row['Year'])
-        temps.append(t)
-        rains.append(r)
-        humids.append(h)
-        
-    base_df['Avg_Temp'] = temps
-    base_df['Total_Rainfall'] = rains
-    base_df['Avg_Humidity'] = humids
-    
+    workers = workers or parallel.WORKERS
+    print(f"[INFO] Merging Weather Data for {len(base_df)} rows ({workers} worker(s))...")
+    base_df['Weather_Key'] = (base_df['District'].astype(str) + "_" + base_df['State'].astype(str)).str.replace(" ", "_").str.lower()
+    base_df['Year'] = base_df['Year'].astype(int)
+
+    # Sharded by State: every worker reads only its own districts' weather files
+    shards = parallel.split_by_state(base_df, workers)
+    if not season_windows(base_df)[2].all() and weather_cube.load_cube(weather_dir=WEATHER_DIR) is None:
+        # Built once here rather than by several workers at the same time
+        weather_cube.build_cube(WEATHER_DIR)
+    results = parallel.map_shards(merge_weather_shard, shards, workers)
+
+    # Deterministic combine: original row order, whatever order the shards finished in
+    base_df = pd.concat([rows for rows, _, _ in results]).sort_index()
+    refreshed = sum(n for _, _, n in results)
+    scanned = sum(f['Source'].nunique() for _, f, _ in results)
+    telemetry.count('weather_annual.hit', scanned - refreshed)
+    telemetry.count('weather_annual.miss', refreshed)
+    if refreshed:
+        files = pd.concat([f for _, f, _ in results if len(f)], ignore_index=True)
+        files = files.drop_duplicates(['Source', 'Year']).sort_values(['Source', 'Year'], kind='stable')
+        print(f"[INFO] Recomputed yearly weather for {refreshed} files.")
+        weather_cube.store_annual_table(files)
+    skipped = skip_bad_weather(base_df, audit_weather.bad_years())
+    if skipped:
+        print(f"[WARN] Skipping {skipped} rows whose district-year failed the weather audit.")
     # 6. Save
+    merged_rows = len(base_df)
     final_df = base_df.dropna(subset=['Avg_Temp'])
+    partial = int(final_df['Partial_Weather'].sum())
+    if partial:
+        print(f"[WARN] {partial} rows have a season that runs past the weather data; their weather covers only the days available (Partial_Weather).")
+    final_df = final_df.drop(columns=['Weather_Key'])
+    del base_df  # final_df is the only frame left, so write_master can cast it in place
+    telemetry.rows('crop_table', crop_rows)
+    telemetry.rows('merged', merged_rows)
+    telemetry.rows('skipped_bad_weather', skipped)
+    telemetry.rows('dropped_no_weather', merged_rows - len(final_df))
+    telemetry.rows('partial_weather', partial)
+    telemetry.rows('output', len(final_df))
     
     print("-" * 30)
     print("MERGE COMPLETE")
-    print(f"Original Crop Rows: {len(crop_df)}")
+    print(f"Original Crop Rows: {crop_rows}")
     print(f"Final Dataset Rows: {len(final_df)}")
     print("-" * 30)
     
     os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-    final_df.to_csv(OUTPUT_PATH, index=False)
+    schema.write_master(final_df, OUTPUT_PATH)
+    print(f"File saved to: {OUTPUT_PATH}")
+
+def merge_data_chunked():
+    """
+    Out-of-core merge for crop tables larger than RAM (config.CHUNKED_MODE).
+    Reshaped batches are spilled to disk per State (up to MEMORY_LIMIT_MB is kept in memory),
+    then every State is deduplicated, given its weather and appended to the output.
+    Peak memory is one State's rows instead of the whole country. Same output as merge_data.
+    """
+    keys = ['State', 'District', 'Year', 'Crop', 'Season']
+    print("[INFO] Chunked mode: reshaping batches and spilling them per State...")
+    states = spill.Spill('merge')
+    crop_rows, metrics, present = 0, None, set()
+    try:
+        for batch in crop_data.iter_crop_batches(CROP_DATA_PATH):
+            crop_rows += len(batch)
+            if metrics is None:
+                # Every batch has the same header; fix the metric columns once so spilled parts line up
+                metrics = sorted(set(decode_crop_header(batch.columns[3:]).get_level_values('Metric')))
+            piece = reshape_crop_batch(batch)
+            present.update(c for c in piece.columns if c in metrics)
+            piece = piece.reindex(columns=keys + metrics)
+            for state, rows in piece.groupby('State', sort=False):
+                states.append(state, rows)
+    except Exception as e:
+        print(f"[ERROR] Data load failed: {e}")
+        states.clear()
+        return
+    # Metric columns that are empty everywhere are left out, as in the in-memory merge
+    metrics = [m for m in metrics if m in present]
+
+    os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
+    tmp_path = OUTPUT_PATH + ".tmp"
+    print(f"[INFO] Merging Weather Data one State at a time ({len(states.keys())} states)...")
+    final_rows, merged_rows, files, refreshed, scanned, skipped, partial = 0, 0, [], 0, 0, 0, 0
+    bad = audit_weather.bad_years()
+    for i, state in enumerate(states.keys()):
+        # First non-null value per key across batches, sorted: States go out in sorted order
+        state_df = states.read(state).groupby(keys, sort=True).first().reset_index()[keys + metrics]
+        state_df['Weather_Key'] = (state_df['District'].astype(str) + "_" + state_df['State'].astype(str)).str.replace(" ", "_").str.lower()
+        state_df['Year'] = state_df['Year'].astype(int)
+
+        state_df, state_files, n = merge_weather_shard(state_df)
+        refreshed += n
+        scanned += state_files['Source'].nunique()
+        if n:
+            files.append(state_files)
+        merged_rows += len(state_df)
+        skipped += skip_bad_weather(state_df, bad)
+        state_df = state_df.dropna(subset=['Avg_Temp'])
+        partial += int(state_df['Partial_Weather'].sum())
+        state_df = schema.apply_schema(state_df.drop(columns=['Weather_Key']))
+        state_df.to_csv(tmp_path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        final_rows += len(state_df)
+    states.clear()
+    if skipped:
+        print(f"[WARN] Skipped {skipped} rows whose district-year failed the weather audit.")
+    if partial:
+        print(f"[WARN] {partial} rows have a season that runs past the weather data; their weather covers only the days available (Partial_Weather).")
+    telemetry.count('weather_annual.hit', scanned - refreshed)
+    telemetry.count('weather_annual.miss', refreshed)
+    telemetry.rows('crop_table', crop_rows)
+    telemetry.rows('merged', merged_rows)
+    telemetry.rows('skipped_bad_weather', skipped)
+    telemetry.rows('dropped_no_weather', merged_rows - final_rows)
+    telemetry.rows('partial_weather', partial)
+    telemetry.rows('output', final_rows)
+
+    if refreshed:
+        files = pd.concat(files, ignore_index=True).drop_duplicates(['Source', 'Year'])
+        print(f"[INFO] Recomputed yearly weather for {refreshed} files.")
+        weather_cube.store_annual_table(files.sort_values(['Source', 'Year'], kind='stable'))
+
+    print("-" * 30)
+    print("MERGE COMPLETE")
+    print(f"Original Crop Rows: {crop_rows}")
+    print(f"Final Dataset Rows: {final_rows}")
+    print("-" * 30)
+    if not os.path.exists(tmp_path):
+        return
+    os.replace(tmp_path, OUTPUT_PATH)
     print(f"File saved to: {OUTPUT_PATH}")
 
 if __name__ == "__main__":
@@ -1,7 +1,7 @@
-import pandas as pd
 import os
-import re
 from src.config import RAW_CROP_DATA, WEATHER_DATA_DIR
+from src import crop_data
+from src import weather_cube
 # CONFIG
 CROP_DATA_PATH = RAW_CROP_DATA
 WEATHER_DIR = WEATHER_DATA_DIR
@@ -10,19 +10,8 @@ def debug_one_row():
     
     # 1. Load ONE row of Gov Data
     try:
-        dfs = pd.read_html(CROP_DATA_PATH, flavor='bs4')
-        df = dfs[0]
-        
-        # Force Column Rename (same as merger script)
-        new_columns = list(df.columns)
-        new_columns[0] = 'State'
-        new_columns[1] = 'District'
-        new_columns[2] = 'Year'
-        df.columns = new_columns
-        
-        # Clean Text (The Fix we applied)
-        df['State'] = df['State'].astype(str).str.strip().str.replace(r'^\d+\.\s*', '', regex=True)
-        df['District'] = df['District'].astype(str).str.strip().str.replace(r'^\d+\.\s*', '', regex=True)
+        # Shared loader: renamed + cleaned State/District/Year (Parquet cached)
+        df = crop_data.load_crop_table(CROP_DATA_PATH)
         
         # Grab the first row
         row = df.iloc[0]
@@ -38,7 +27,8 @@ def debug_one_row():
     # 2. Construct Filename
     safe_name = f"{row['District']}_{row['State']}".replace(" ", "_").lower()
     expected_file = f"{safe_name}.csv"
-    full_path = os.path.join(WEATHER_DIR, expected_file)
+    # Grid-cell file if the fetcher linked this district, else the per-district file
+    full_path = weather_cube.weather_sources(WEATHER_DIR).get(safe_name, os.path.join(WEATHER_DIR, expected_file))
     
     print(f"\n[2] LOOKING FOR WEATHER FILE:")
     print(f"    Expected Name: {expected_file}")
@@ -55,8 +45,12 @@ def debug_one_row():
 
     # 3. Check Data Inside File
     try:
-        w_df = pd.read_csv(full_path)
-        w_df['Date'] = pd.to_datetime(w_df.iloc[:, 0]) # Use index 0 as Date
+        # Read from the packed cube if it has been built (no CSV parse)
+        cube = weather_cube.load_cube()
+        if cube is not None and safe_name in cube:
+            w_df = cube.to_frame(safe_name)
+        else:
+            w_df = weather_cube.read_weather_csv(full_path)
         
         print(f"\n[3] CHECKING WEATHER CONTENT:")
         print(f"    Weather Data Min Year: {w_df['Date'].dt.year.min()}")
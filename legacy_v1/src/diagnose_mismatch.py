@@ -1,7 +1,7 @@
-import pandas as pd
 import os
-import re
 from src.config import RAW_CROP_DATA, WEATHER_DATA_DIR
+from src import crop_data
+from src import weather_cube
 # CONFIG
 CROP_DATA_PATH = RAW_CROP_DATA
 WEATHER_DIR = WEATHER_DATA_DIR
@@ -10,27 +10,16 @@ def diagnose_specific():
     
     # 1. Load Gov Data
     try:
-        dfs = pd.read_html(CROP_DATA_PATH)
-        df = dfs[0]
-        
-        # Rename by Index
-        new_columns = list(df.columns)
-        new_columns[0] = 'State'
-        new_columns[1] = 'District'
-        new_columns[2] = 'Year'
-        df.columns = new_columns
-        
-        # Clean
-        df['State'] = df['State'].astype(str).str.strip().str.replace(r'^\d+\.\s*', '', regex=True)
-        df['District'] = df['District'].astype(str).str.strip().str.replace(r'^\d+\.\s*', '', regex=True)
+        # Shared loader: renamed + cleaned State/District/Year (Parquet cached)
+        df = crop_data.load_crop_table(CROP_DATA_PATH)
         
     except Exception as e:
         print(f"Error loading data: {e}")
         return
 
-    # 2. Get Files
+    # 2. Get Files (grid-cell files through the fetcher's links, else per-district files)
     if not os.path.exists(WEATHER_DIR): return
-    actual_files = set(os.listdir(WEATHER_DIR))
+    sources = weather_cube.weather_sources(WEATHER_DIR)
 
     # 3. Find Pune (or any existing district)
     # We filter the dataframe to find a row where District contains "Pune"
@@ -52,7 +41,8 @@ def diagnose_specific():
     print(f"   District: '{raw_dist}'")
     print(f"   Looking for file: [{target_file}]")
     
-    if target_file in actual_files:
+    if target_name in sources:
+        print(f"   Resolved to:      [{os.path.relpath(sources[target_name], WEATHER_DIR)}]")
         print("\n MATCH CONFIRMED! The naming logic is correct.")
         print("   The issue must be in the YEAR matching.")
     else:
@@ -1,11 +1,16 @@
 import pandas as pd
-from geopy.geocoders import Nominatim
+from geopy.geocoders import Nominatim, Photon, ArcGIS
 from geopy.extra.rate_limiter import RateLimiter
 from tqdm import tqdm
 import os
+import queue
+import sqlite3
+import threading
+import time
 import re  # Added for removing numbers like "1. "
 
-from src.config import RAW_CROP_DATA, DISTRICT_MAPPING
+from src import crop_data
+from src.config import RAW_CROP_DATA, DISTRICT_MAPPING, GEOCODE_CACHE, GAZETTEER, GEOCODERS
 
 # ==========================================
 # CONFIGURATION (Updated with your filenames)
@@ -14,6 +19,13 @@ from src.config import RAW_CROP_DATA, DISTRICT_MAPPING
 RAW_DATA_PATH = RAW_CROP_DATA
 # Output File
 OUTPUT_PATH = DISTRICT_MAPPING
+# Geocoding cache (normalized query -> coordinates or "not found")
+CACHE_PATH = GEOCODE_CACHE
+# Optional offline gazetteer (state_name, district_name, latitude, longitude)
+GAZETTEER_PATH = GAZETTEER
+
+# Rough bounding box of India, used to reject hits in the wrong country
+INDIA_BOUNDS = (6.0, 38.0, 68.0, 98.0)
 
 # ==========================================
 # LOGIC
@@ -31,26 +43,20 @@ def clean_text(text):
 def extract_unique_locations(file_path):
     print(f"[INFO] Reading raw data from {file_path}...")
     try:
-        # Parse HTML
-        dfs = pd.read_html(file_path)
-        if not dfs:
+        # Shared loader (names already cleaned, cached after the first parse)
+        df = crop_data.load_crop_table(file_path)
+        if df is None:
             raise ValueError("No data tables found.")
-            
-        df = dfs[0]
         
-        # Extract Col 0 (State) and Col 1 (District)
+        # Extract State and District
         print("[INFO] Cleaning State and District names...")
-        locations = df.iloc[:, [0, 1]].copy()
+        locations = df[['State', 'District']].copy()
         locations.columns = ['state_name', 'district_name']
         
         # Basic cleanup
-        locations = locations.dropna()
-        locations = locations[locations['district_name'].astype(str).str.lower() != 'total']
-        locations = locations[locations['state_name'].astype(str).str.lower() != 'state']
-
-        # === NEW: Remove the "1. ", "2. " prefixes ===
-        locations['state_name'] = locations['state_name'].apply(clean_text)
-        locations['district_name'] = locations['district_name'].apply(clean_text)
+        locations = locations[(locations['state_name'] != 'nan') & (locations['district_name'] != 'nan')]
+        locations = locations[locations['district_name'].str.lower() != 'total']
+        locations = locations[locations['state_name'].str.lower() != 'state']
 
         # Remove duplicates
         locations = locations.drop_duplicates().reset_index(drop=True)
@@ -64,6 +70,160 @@ def extract_unique_locations(file_path):
         print(f"[ERROR] Failed to read file: {e}")
         return None
 
+def normalize_key(district, state):
+    """
+    Cache / gazetteer key for a district: lowercase, no "1. " prefix, "&" -> "and",
+    single spaces. Example: ("1. North  Goa", "Goa") -> "north goa|goa"
+    """
+    def norm(text):
+        text = clean_text(text).lower().replace('&', ' and ')
+        return re.sub(r'\s+', ' ', text).strip()
+    return f"{norm(district)}|{norm(state)}"
+
+# ==========================================
+# CACHE
+# ==========================================
+class GeocodeCache:
+    """
+    SQLite table of normalized key -> (latitude, longitude, provider).
+    A row with found = 0 is a remembered negative result, so it is not retried.
+    """
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            " key TEXT PRIMARY KEY, found INTEGER, latitude REAL, longitude REAL,"
+            " provider TEXT, updated TEXT)"
+        )
+        self.conn.commit()
+
+    def lookup(self, keys):
+        """{key: (latitude, longitude) or None} for the keys that are cached."""
+        hits = {}
+        keys = list(keys)
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT key, found, latitude, longitude FROM geocode WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            for key, found, lat, lon in rows:
+                hits[key] = (lat, lon) if found else None
+        return hits
+
+    def store(self, key, coords, provider):
+        found = coords is not None
+        lat, lon = coords if found else (None, None)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO geocode VALUES (?, ?, ?, ?, ?, ?)",
+            (key, int(found), lat, lon, provider, time.strftime('%Y-%m-%dT%H:%M:%S'))
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+def load_gazetteer(path=None):
+    """{normalized key: (latitude, longitude)} from the offline gazetteer, empty if absent."""
+    path = path or GAZETTEER_PATH
+    if not os.path.exists(path):
+        return {}
+    gaz = pd.read_csv(path).dropna(subset=['latitude', 'longitude'])
+    keys = [normalize_key(d, s) for d, s in zip(gaz['district_name'], gaz['state_name'])]
+    return dict(zip(keys, zip(gaz['latitude'], gaz['longitude'])))
+
+# ==========================================
+# BATCH RESOLVER
+# ==========================================
+def make_geocoder(name):
+    if name == 'nominatim':
+        return Nominatim(user_agent="agrifusion_project_student_v2")
+    if name == 'photon':
+        return Photon(user_agent="agrifusion_project_student_v2")
+    if name == 'arcgis':
+        return ArcGIS()
+    raise ValueError(f"Unknown geocoder: {name}")
+
+def in_india(lat, lon):
+    south, north, west, east = INDIA_BOUNDS
+    return south <= lat <= north and west <= lon <= east
+
+def resolve_batch(queries, providers=GEOCODERS):
+    """
+    Geocodes {key: "District, State, India"} across several providers at once.
+    Every provider has its own worker thread and rate limit. A miss is handed to the
+    next provider that hasn't tried the query; a key is negative only once all have missed.
+    Yields (key, (latitude, longitude) or None, provider) as results arrive. provider is
+    'error' when a provider failed along the way, so the miss shouldn't be cached.
+    """
+    names = [name for name, _ in providers]
+    inboxes = {name: queue.Queue() for name in names}
+    results = queue.Queue()
+
+    # Built before any thread starts, so an unknown provider or a bad setup fails right here.
+    # Errors must reach the worker (not come back as None), so they aren't cached as negatives.
+    geocoders = {
+        name: RateLimiter(make_geocoder(name).geocode, min_delay_seconds=min_delay, max_retries=2,
+                          swallow_exceptions=False)
+        for name, min_delay in providers
+    }
+
+    def attempt(name, item):
+        key, query, tried, errored = item
+        tried = tried + [name]
+        try:
+            location = geocoders[name](query)
+        except Exception as e:
+            print(f"[WARN] {name} error for {query}: {e}")
+            location, errored = None, True
+
+        if location and in_india(location.latitude, location.longitude):
+            results.put((key, (location.latitude, location.longitude), name))
+            return
+        remaining = [n for n in names if n not in tried]
+        if remaining:
+            # Hand the miss to the least busy provider that hasn't seen it
+            nxt = min(remaining, key=lambda n: inboxes[n].qsize())
+            inboxes[nxt].put((key, query, tried, errored))
+        else:
+            results.put((key, None, 'error' if errored else name))
+
+    def worker(name):
+        inbox = inboxes[name]
+        while True:
+            item = inbox.get()
+            if item is None:
+                return
+            try:
+                attempt(name, item)
+            except Exception as e:
+                # Whatever goes wrong, the query still gets an answer so the caller never blocks
+                print(f"[WARN] {name} failed on {item[1]}: {e}")
+                results.put((item[0], None, 'error'))
+
+    threads = [threading.Thread(target=worker, args=(name,), daemon=True) for name in names]
+    for t in threads:
+        t.start()
+
+    # Spread the initial work round-robin so every provider starts busy
+    for i, (key, query) in enumerate(queries.items()):
+        inboxes[names[i % len(names)]].put((key, query, [], False))
+
+    for _ in range(len(queries)):
+        yield results.get()
+
+    for name in names:
+        inboxes[name].put(None)
+
+def save_rows(rows):
+    if not rows:
+        return
+    temp_df = pd.DataFrame(rows, columns=['state_name', 'district_name', 'latitude', 'longitude'])
+    mode = 'a' if os.path.exists(OUTPUT_PATH) else 'w'
+    header = not os.path.exists(OUTPUT_PATH)
+    temp_df.to_csv(OUTPUT_PATH, mode=mode, header=header, index=False)
+
 def fetch_coordinates(locations_df):
     # Check if we need to resume (handle empty file case)
     if os.path.exists(OUTPUT_PATH):
@@ -80,59 +240,56 @@ def fetch_coordinates(locations_df):
     else:
         processed_keys = set()
 
-    # Setup Geocoder
-    geolocator = Nominatim(user_agent="agrifusion_project_student_v2")
-    geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1.0)
+    # Only districts that aren't in the mapping yet
+    todo = locations_df[~(locations_df['district_name'] + "_" + locations_df['state_name']).isin(processed_keys)]
+    todo = todo.assign(key=[normalize_key(d, s) for d, s in zip(todo['district_name'], todo['state_name'])])
+    print(f"[INFO] {len(todo)} of {len(locations_df)} districts are not in the mapping yet.")
+    if todo.empty:
+        print(f"[DONE] Coordinates saved to {OUTPUT_PATH}")
+        return
 
-    new_rows = []
-    
-    print(f"[INFO] Starting Geocoding for {len(locations_df)} districts...")
-    
-    # Use tqdm for progress bar
-    for index, row in tqdm(locations_df.iterrows(), total=locations_df.shape[0]):
-        state = row['state_name']
-        district = row['district_name']
-        unique_key = f"{district}_{state}"
-
-        if unique_key in processed_keys:
+    # 1. Cache, 2. offline gazetteer, 3. network providers
+    cache = GeocodeCache(CACHE_PATH)
+    resolved = cache.lookup(todo['key'].unique())
+    print(f"[INFO] Cache hits: {len(resolved)}")
+
+    gazetteer = load_gazetteer()
+    for key in todo['key'].unique():
+        if key not in resolved and key in gazetteer:
+            resolved[key] = gazetteer[key]
+            cache.store(key, gazetteer[key], 'gazetteer')
+
+    pending = todo[~todo['key'].isin(resolved)].drop_duplicates('key')
+    queries = {row.key: f"{row.district_name}, {row.state_name}, India" for row in pending.itertuples()}
+    print(f"[INFO] Starting Geocoding for {len(queries)} districts...")
+
+    # Each answer goes to the cache immediately, so an interrupted run loses nothing
+    failed = set()
+    for key, coords, provider in tqdm(resolve_batch(queries), total=len(queries)):
+        if provider == 'error':
+            failed.add(key)
             continue
+        resolved[key] = coords
+        cache.store(key, coords, provider)
+    cache.close()
+    if failed:
+        print(f"[WARN] {len(failed)} districts failed with provider errors; they will be retried next run.")
 
-        query = f"{district}, {state}, India"
-        
-        try:
-            location = geocode(query)
-            if location:
-                new_rows.append({
-                    'state_name': state,
-                    'district_name': district,
-                    'latitude': location.latitude,
-                    'longitude': location.longitude
-                })
-            else:
-                new_rows.append({
-                    'state_name': state,
-                    'district_name': district,
-                    'latitude': None,
-                    'longitude': None
-                })
-                
-        except Exception as e:
-            print(f"[WARN] Error for {query}: {e}")
-
-        # Save batch every 10 rows
-        if len(new_rows) >= 10:
-            temp_df = pd.DataFrame(new_rows)
-            mode = 'a' if os.path.exists(OUTPUT_PATH) else 'w'
-            header = not os.path.exists(OUTPUT_PATH)
-            temp_df.to_csv(OUTPUT_PATH, mode=mode, header=header, index=False)
-            new_rows = []
-
-    # Final Save
-    if new_rows:
-        temp_df = pd.DataFrame(new_rows)
-        mode = 'a' if os.path.exists(OUTPUT_PATH) else 'w'
-        header = not os.path.exists(OUTPUT_PATH)
-        temp_df.to_csv(OUTPUT_PATH, mode=mode, header=header, index=False)
+    # One write of the new rows (not found -> empty coordinates, as before).
+    # Districts that failed with errors stay out of the mapping, so the next run retries them.
+    new_rows = []
+    for row in todo.itertuples():
+        if row.key in failed:
+            continue
+        coords = resolved.get(row.key)
+        lat, lon = coords if coords else (None, None)
+        new_rows.append({
+            'state_name': row.state_name,
+            'district_name': row.district_name,
+            'latitude': lat,
+            'longitude': lon
+        })
+    save_rows(new_rows)
 
     print(f"[DONE] Coordinates saved to {OUTPUT_PATH}")
 
@@ -1,15 +1,12 @@
-import pandas as pd
-
-
 from src.config import RAW_CROP_DATA
+from src import crop_data
 # Path to your file
 FILE_PATH = RAW_CROP_DATA
 print("Loading dataset... (This might take a moment)")
 
 try:
-    # Remember: It is an HTML file disguised as XLS
-    dfs = pd.read_html(FILE_PATH)
-    df = dfs[0] # Get the main table
+    # Remember: It is an HTML file disguised as XLS (parsed once, then cached)
+    df = crop_data.load_crop_table(FILE_PATH)
     
     # 1. Total Rows
     total_rows = len(df)
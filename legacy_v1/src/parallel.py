@@ -0,0 +1,71 @@
+import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from src.config import PARALLEL_WORKERS
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+WORKERS = PARALLEL_WORKERS
+
+# ==========================================
+# SHARDING BY STATE
+# ==========================================
+def assign_shards(weights, n_shards):
+    """
+    Splits states into at most n_shards groups of similar total weight (e.g. row counts).
+    Heaviest state first onto the lightest shard; ties broken by name, so the result is
+    the same on every run.
+    """
+    shards = [[] for _ in range(max(1, min(n_shards, len(weights))))]
+    loads = [0] * len(shards)
+    for state, weight in sorted(weights.items(), key=lambda kv: (-kv[1], str(kv[0]))):
+        i = int(np.argmin(loads))
+        shards[i].append(state)
+        loads[i] += weight
+    return [sorted(shard, key=str) for shard in shards if shard]
+
+def split_by_state(df, n_shards):
+    """df cut into whole-state pieces (original index kept, so pieces can be reassembled)."""
+    states = df['State'].astype(str)
+    groups = assign_shards(states.value_counts().to_dict(), n_shards)
+    return [df[states.isin(group)] for group in groups]
+
+def map_shards(func, items, workers=None):
+    """
+    func over every item in a process pool, results in input order.
+    With one worker (or one item) everything runs in this process.
+    """
+    workers = workers or WORKERS
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ProcessPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(func, items))
+
+# ==========================================
+# CROSS-SHARD MEANS
+# ==========================================
+def partial_means(df, keys, col):
+    """Per-group sum and non-null count of col; shards' partials combine into exact means."""
+    values = df[col].astype(np.float64)
+    grouped = values.groupby([df[k].astype(str) for k in keys])
+    return pd.DataFrame({'sum': grouped.sum(), 'count': grouped.count()})
+
+def add_partials(total, partial):
+    """Running total of partial sums / counts (keeps memory flat over many chunks)."""
+    if total is None:
+        return partial
+    return pd.concat([total, partial]).groupby(level=list(range(partial.index.nlevels))).sum()
+
+def combine_means(partials):
+    """Adds up the shards' partial sums / counts and returns the mean per group."""
+    total = pd.concat(partials).groupby(level=list(range(partials[0].index.nlevels))).sum()
+    return (total['sum'] / total['count'].replace(0, np.nan)).rename('mean')
+
+def lookup_means(means, df, keys):
+    """Group mean for every row of df (NaN where the group has no values)."""
+    if len(keys) == 1:
+        index = pd.Index(df[keys[0]].astype(str))
+    else:
+        index = pd.MultiIndex.from_arrays([df[k].astype(str) for k in keys])
+    return pd.Series(means.reindex(index).values, index=df.index)
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import time
+from src import telemetry
+from src.config import BASE_DIR, PIPELINE_STATE
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+STATE_PATH = PIPELINE_STATE
+
+# ==========================================
+# STAGES
+# ==========================================
+class Stage:
+    """
+    One pipeline step. inputs / outputs are file or folder paths; params is any
+    JSON-able value (e.g. a date window) that should also invalidate the stage.
+    """
+    def __init__(self, name, func, inputs, outputs, params=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params
+
+def order_stages(stages):
+    """Topological order: a stage runs after every stage that produces one of its inputs."""
+    producers = {path: s.name for s in stages for path in s.outputs}
+    by_name = {s.name: s for s in stages}
+    ordered, visiting, done = [], set(), set()
+
+    def visit(stage):
+        if stage.name in done:
+            return
+        if stage.name in visiting:
+            raise ValueError(f"Pipeline cycle at stage '{stage.name}'")
+        visiting.add(stage.name)
+        for path in stage.inputs:
+            upstream = producers.get(path)
+            if upstream and upstream != stage.name:
+                visit(by_name[upstream])
+        visiting.discard(stage.name)
+        done.add(stage.name)
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return ordered
+
+# ==========================================
+# CONTENT HASHES
+# ==========================================
+class Hasher:
+    """
+    SHA-256 of files and folders. A file's digest is reused from the previous run while
+    its size and mtime are unchanged, so a no-op run hardly reads anything.
+    """
+    def __init__(self, known=None):
+        self.known = known or {}
+        self.seen = {}
+
+    def file(self, path):
+        stat = os.stat(path)
+        key = os.path.relpath(path, BASE_DIR)
+        old = self.known.get(key)
+        if old and old['size'] == stat.st_size and old['mtime'] == stat.st_mtime:
+            digest = old['sha256']
+        else:
+            h = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    h.update(block)
+            digest = h.hexdigest()
+        self.seen[key] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': digest}
+        return digest
+
+    def path(self, path):
+        """Digest of a file, or of a folder's relative names + file digests. None if missing."""
+        if os.path.isfile(path):
+            return self.file(path)
+        if not os.path.isdir(path):
+            return None
+        h = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(('.tmp', '.part')):
+                    continue
+                full = os.path.join(root, name)
+                h.update(os.path.relpath(full, path).encode())
+                h.update(self.file(full).encode())
+        return h.hexdigest()
+
+def signature(hasher, paths):
+    """{path relative to the project: digest} for a list of paths."""
+    return {os.path.relpath(p, BASE_DIR): hasher.path(p) for p in paths}
+
+def params_digest(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+# ==========================================
+# RUNNER
+# ==========================================
+def load_state(path=None):
+    path = path or STATE_PATH
+    if not os.path.exists(path):
+        return {'stages': {}, 'files': {}}
+    with open(path) as f:
+        return json.load(f)
+
+def save_state(state, path=None):
+    path = path or STATE_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_path, path)
+
+def stale_reason(stage, record, hasher):
+    """Why a stage must run, or None if its recorded inputs and outputs still match."""
+    if record is None:
+        return "never ran"
+    if record.get('params') != params_digest(stage.params):
+        return "parameters changed"
+    inputs = signature(hasher, stage.inputs)
+    changed = [p for p, digest in inputs.items() if record['inputs'].get(p) != digest]
+    if changed:
+        return f"input changed: {changed[0]}"
+    outputs = signature(hasher, stage.outputs)
+    changed = [p for p, digest in outputs.items() if digest is None or record['outputs'].get(p) != digest]
+    if changed:
+        return f"output missing or modified: {changed[0]}"
+    return None
+
+def run_stages(stages, force=(), dry_run=False, state_path=None):
+    """
+    Runs the stages in dependency order, skipping every stage whose inputs, outputs and
+    params hash the same as when it last succeeded. force: stage names (or 'all') to run anyway.
+    """
+    state = load_state(state_path)
+    hasher = Hasher(state.get('files'))
+    force = set(force)
+    names = [s.name for s in stages]
+    unknown = force - set(names) - {'all'}
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {sorted(unknown)}. Choose from {names}")
+
+    ordered = order_stages(stages)
+    for i, stage in enumerate(ordered, 1):
+        record = state['stages'].get(stage.name)
+        reason = "forced" if ('all' in force or stage.name in force) else stale_reason(stage, record, hasher)
+
+        if reason is None:
+            print(f"\n[STEP {i}/{len(ordered)}] {stage.name}: up to date, skipped.")
+            continue
+        print(f"\n[STEP {i}/{len(ordered)}] {stage.name}: running ({reason})...")
+        if dry_run:
+            continue
+
+        inputs = signature(hasher, stage.inputs)
+        started = time.time()
+        with telemetry.stage(stage.name, reason=reason):
+            stage.func()
+        outputs = signature(hasher, stage.outputs)
+
+        if any(digest is None for digest in outputs.values()):
+            # Stage functions report their own errors; without outputs there is nothing to record
+            print(f"[WARN] {stage.name} did not produce all of its outputs; it will run again next time.")
+            state['stages'].pop(stage.name, None)
+        else:
+            state['stages'][stage.name] = {
+                'inputs': inputs,
+                'outputs': outputs,
+                'params': params_digest(stage.params),
+                'seconds': round(time.time() - started, 2),
+                'finished': time.strftime('%Y-%m-%dT%H:%M:%S')
+            }
+        state['files'] = {**state.get('files', {}), **hasher.seen}
+        save_state(state, state_path)
+
+    if not dry_run:
+        state['files'] = {**state.get('files', {}), **hasher.seen}
+        save_state(state, state_path)
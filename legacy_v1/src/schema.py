@@ -0,0 +1,84 @@
+import pandas as pd
+
+# ==========================================
+# MASTER DATASET SCHEMA
+# ==========================================
+# One set of dtypes for the crop table, the master dataset and everything derived from it.
+# Bump SCHEMA_VERSION when a dtype changes so typed caches are rebuilt.
+SCHEMA_VERSION = 2
+
+# Repeated labels -> categorical (one small code per row instead of a Python string)
+KEY_COLUMNS = ['State', 'District', 'Crop', 'Season', 'Category', 'Weather_Key']
+YEAR_DTYPE = 'int16'
+
+# Government crop figures -> float64, on disk and in memory: production reaches 10^9 (coconut
+# nuts), past float32's 24-bit mantissa, and the master must keep the source values exactly
+SOURCE_DTYPE = 'float64'
+SOURCE_COLUMNS = ['Area (Hectare)', 'Production (Tonnes)', 'Yield (Tonne/Hectare)']
+
+# Weather and derived measures -> float32
+MEASURE_DTYPE = 'float32'
+MEASURE_COLUMNS = ['Avg_Temp', 'Total_Rainfall', 'Avg_Humidity']
+
+# Units only a few crops report (cotton in bales, coconut in nuts): nullable, mostly empty
+UNIT_DTYPE = 'Float64'
+UNIT_COLUMNS = [
+    'Production (Bales)', 'Production (Nuts)', 'Yield (Bales/Hectare)', 'Yield (Nuts/Hectare)'
+]
+
+# Row flags -> bool (Partial_Weather: the season runs past the last day of the weather data)
+FLAG_DTYPE = 'bool'
+FLAG_COLUMNS = ['Partial_Weather']
+
+def csv_dtypes():
+    """dtype= mapping for pd.read_csv, so columns are parsed straight into their final types."""
+    dtypes = {col: 'category' for col in KEY_COLUMNS}
+    dtypes.update({col: SOURCE_DTYPE for col in SOURCE_COLUMNS})
+    dtypes.update({col: MEASURE_DTYPE for col in MEASURE_COLUMNS})
+    dtypes.update({col: UNIT_DTYPE for col in UNIT_COLUMNS})
+    dtypes.update({col: FLAG_DTYPE for col in FLAG_COLUMNS})
+    dtypes['Year'] = YEAR_DTYPE
+    return dtypes
+
+def apply_schema(df):
+    """
+    Casts a frame in place of the schema: categorical keys, int16 Year, float64 crop figures
+    (nullable Float64 units), bool flags and float32 for every other float column (weather,
+    derived features).
+    """
+    for col in df.columns:
+        dtype = df[col].dtype
+        if col in KEY_COLUMNS:
+            if not isinstance(dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype('category')
+        elif col == 'Year':
+            if df[col].notna().all():
+                df[col] = df[col].astype(YEAR_DTYPE)
+        elif col in SOURCE_COLUMNS:
+            df[col] = df[col].astype(SOURCE_DTYPE)
+        elif col in UNIT_COLUMNS:
+            df[col] = df[col].astype(UNIT_DTYPE)
+        elif col in FLAG_COLUMNS:
+            df[col] = df[col].astype(FLAG_DTYPE)
+        elif pd.api.types.is_float_dtype(dtype) and not pd.api.types.is_extension_array_dtype(dtype):
+            df[col] = df[col].astype(MEASURE_DTYPE)
+    return df
+
+def read_master(path, columns=None, nrows=None, chunksize=None):
+    """
+    Reads the master dataset (or any CSV of its columns) already typed; columns prunes what is parsed.
+    With chunksize, yields typed chunks of that many rows instead.
+    """
+    if chunksize:
+        reader = pd.read_csv(path, usecols=columns, dtype=csv_dtypes(), chunksize=chunksize)
+        return (apply_schema(chunk) for chunk in reader)
+    df = pd.read_csv(path, usecols=columns, dtype=csv_dtypes(), nrows=nrows)
+    return apply_schema(df)
+
+def write_master(df, path):
+    """Writes a master-style frame as CSV after casting it to the schema."""
+    apply_schema(df).to_csv(path, index=False)
+    return df
+
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 1e6
@@ -0,0 +1,75 @@
+import pandas as pd
+import os
+import shutil
+from src.config import SPILL_DIR, MEMORY_LIMIT_MB
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+SPILL_ROOT = SPILL_DIR
+LIMIT_MB = MEMORY_LIMIT_MB
+
+# ==========================================
+# DISK SPILL
+# ==========================================
+class Spill:
+    """
+    Rows grouped by a partition key (e.g. State), held in memory up to limit_mb and
+    written to Parquet files under SPILL_DIR/<name>/ beyond that.
+    read(key) returns one partition, so only one partition is ever fully in memory.
+    """
+    def __init__(self, name, limit_mb=None):
+        self.root = os.path.join(SPILL_ROOT, name)
+        self.limit = (limit_mb or LIMIT_MB) * 1e6
+        self.slots = {}      # key -> folder number
+        self.buffers = {}    # key -> [DataFrame, ...] not yet on disk
+        self.buffered = 0
+        self.parts = 0
+        if os.path.exists(self.root):
+            shutil.rmtree(self.root)
+        os.makedirs(self.root)
+
+    def append(self, key, df):
+        if df.empty:
+            return
+        self.slots.setdefault(key, len(self.slots))
+        self.buffers.setdefault(key, []).append(df)
+        self.buffered += df.memory_usage(deep=True).sum()
+        if self.buffered > self.limit:
+            self.flush()
+
+    def flush(self):
+        for key, frames in self.buffers.items():
+            folder = os.path.join(self.root, str(self.slots[key]))
+            os.makedirs(folder, exist_ok=True)
+            pd.concat(frames).to_parquet(os.path.join(folder, f"part-{self.parts:05d}.parquet"))
+            self.parts += 1
+        self.buffers, self.buffered = {}, 0
+
+    def keys(self):
+        return sorted(self.slots, key=str)
+
+    def read(self, key):
+        """Whole partition: spilled parts in write order, then whatever is still buffered."""
+        folder = os.path.join(self.root, str(self.slots[key]))
+        frames = []
+        if os.path.exists(folder):
+            frames = [pd.read_parquet(os.path.join(folder, f)) for f in sorted(os.listdir(folder))]
+        frames += self.buffers.get(key, [])
+        return pd.concat(frames)
+
+    def clear(self):
+        self.buffers, self.buffered = {}, 0
+        shutil.rmtree(self.root, ignore_errors=True)
+
+# ==========================================
+# BATCH SIZING
+# ==========================================
+def rows_within(sample, limit_mb=None, overhead=4):
+    """
+    Rows per batch so a batch (times `overhead` for the copies a step makes) stays under limit_mb.
+    sample: a few representative rows.
+    """
+    limit = (limit_mb or LIMIT_MB) * 1e6
+    per_row = max(1.0, sample.memory_usage(deep=True).sum() / max(1, len(sample)))
+    return max(1000, int(limit / (per_row * overhead)))
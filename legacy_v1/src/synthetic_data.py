@@ -0,0 +1,121 @@
+import pandas as pd
+import numpy as np
+import html
+import os
+from src.config import TARGET_CROPS
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+METRICS = ['Area (Hectare)', 'Production (Tonnes)', 'Yield (Tonne/Hectare)']
+SEASONS = ['Whole Year', 'Kharif', 'Rabi']
+MISSING_SHARE = 0.1   # share of empty crop cells, like the real export
+
+# ==========================================
+# GENERATORS
+# ==========================================
+def synthetic_districts(n_districts, seed=0):
+    """n_districts (state, district) pairs spread over roughly sqrt(n) states."""
+    n_states = max(1, int(np.sqrt(n_districts)))
+    rng = np.random.default_rng(seed)
+    states = [f"State {i:02d}" for i in range(n_states)]
+    return pd.DataFrame({
+        'state_name': [states[i] for i in rng.integers(0, n_states, n_districts)],
+        'district_name': [f"District {i:04d}" for i in range(n_districts)],
+        'latitude': rng.uniform(8, 35, n_districts).round(4),
+        'longitude': rng.uniform(68, 97, n_districts).round(4)
+    }).sort_values(['state_name', 'district_name'], ignore_index=True)
+
+def synthetic_crops(n_crops):
+    """(crop, season) columns: the target crops first, then made-up names."""
+    names = list(TARGET_CROPS)[:n_crops] + [f"Crop {i:02d}" for i in range(max(0, n_crops - len(TARGET_CROPS)))]
+    return [(name, SEASONS[i % len(SEASONS)]) for i, name in enumerate(names)]
+
+def write_crop_html(path, districts, years, crops, seed=0):
+    """
+    Government-style export: an HTML table saved as .xls with a 3-row header
+    (crop / season / metric), rowspan'd State/District/Year cells, "1. " prefixed
+    states and "2015-16" style years.
+    """
+    rng = np.random.default_rng(seed)
+    columns = [(crop, season, metric) for crop, season in crops for metric in METRICS]
+    state_no = {s: i + 1 for i, s in enumerate(sorted(districts['state_name'].unique()))}
+
+    out = ['<html><body><table border="1"><thead>']
+    for level in range(3):
+        row = '<th rowspan="3">State</th><th rowspan="3">District</th><th rowspan="3">Year</th>' if level == 0 else ''
+        row += ''.join(f'<th>{html.escape(c[level])}</th>' for c in columns)
+        out.append(f'<tr>{row}</tr>')
+    out.append('</thead><tbody>')
+
+    n_rows = len(districts) * len(years)
+    area = rng.uniform(10, 5000, (n_rows, len(crops))).round(0)
+    yields = rng.uniform(0.5, 90, (n_rows, len(crops))).round(2)
+    missing = rng.random((n_rows, len(crops))) < MISSING_SHARE
+
+    r = 0
+    for state, district in zip(districts['state_name'], districts['district_name']):
+        for year in years:
+            cells = []
+            for c in range(len(crops)):
+                if missing[r, c]:
+                    cells.append('<td></td><td></td><td></td>')
+                else:
+                    cells.append(f'<td>{area[r, c]:.0f}</td><td>{area[r, c] * yields[r, c]:.2f}</td><td>{yields[r, c]:.2f}</td>')
+            out.append(f'<tr><td>{state_no[state]}. {html.escape(state)}</td><td>{html.escape(district)}</td>'
+                       f'<td>{year}-{(year + 1) % 100:02d}</td>{"".join(cells)}</tr>')
+            r += 1
+    out.append('</tbody></table></body></html>')
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write('\n'.join(out))
+    return path
+
+def write_weather(folder, districts, first_year, last_year, seed=0):
+    """
+    NASA POWER-style daily CSV per district (",T2M,Rain,Humidity" with YYYYMMDD dates),
+    named like the fetcher's legacy files: <district>_<state>.csv.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(f"{first_year}-01-01", f"{last_year}-12-31", freq='D')
+    index = dates.strftime('%Y%m%d').astype(int)
+    season = np.sin(2 * np.pi * (dates.dayofyear.values - 100) / 365.25)
+
+    os.makedirs(folder, exist_ok=True)
+    for state, district in zip(districts['state_name'], districts['district_name']):
+        n = len(dates)
+        rain = np.where(rng.random(n) < 0.3 + 0.3 * season, rng.gamma(0.8, 12, n), 0.0)
+        df = pd.DataFrame({
+            'T2M': (25 + 6 * season + rng.normal(0, 2, n)).round(2),
+            'Rain': rain.round(2),
+            'Humidity': np.clip(65 + 20 * season + rng.normal(0, 8, n), 5, 100).round(2)
+        }, index=index)
+        key = f"{district}_{state}".replace(" ", "_").lower()
+        df.to_csv(os.path.join(folder, f"{key}.csv"))
+    return folder
+
+def generate(root, n_districts=100, n_years=5, n_crops=10, first_year=2015, seed=0):
+    """
+    Complete synthetic input set under root: crop export, weather folder and district mapping.
+    Returns the paths. Weather runs one year past the last crop year so Rabi windows are covered.
+    """
+    districts = synthetic_districts(n_districts, seed)
+    years = list(range(first_year, first_year + n_years))
+    crops = synthetic_crops(n_crops)
+
+    paths = {
+        'crop': os.path.join(root, 'raw', 'gov_crop_data', 'crop_production.xls'),
+        'weather': os.path.join(root, 'raw', 'nasa_weather'),
+        'mapping': os.path.join(root, 'interim', 'district_mapping.csv')
+    }
+    write_crop_html(paths['crop'], districts, years, crops, seed)
+    write_weather(paths['weather'], districts, first_year, years[-1] + 1, seed)
+    os.makedirs(os.path.dirname(paths['mapping']), exist_ok=True)
+    districts.to_csv(paths['mapping'], index=False)
+    return paths
+
+if __name__ == "__main__":
+    import sys
+    out = generate(sys.argv[1] if len(sys.argv) > 1 else os.path.join('data', 'synthetic'))
+    print(f"[SUCCESS] Synthetic data written: {out}")
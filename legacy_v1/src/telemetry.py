@@ -0,0 +1,141 @@
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import time
+try:
+    import resource
+except ImportError:   # Unix only; without it peak RSS and worker CPU are recorded as None
+    resource = None
+from src.config import METRICS_ENABLED, METRICS_LOG, PROFILE_DIR
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+ENABLED = METRICS_ENABLED
+LOG_PATH = METRICS_LOG
+PROFILE_PATH = PROFILE_DIR
+PROFILE = False
+
+_current = None   # record of the stage being measured, None when nothing is measured
+
+def configure(enabled=True, log_path=None, profile=False):
+    global ENABLED, LOG_PATH, PROFILE
+    ENABLED = enabled
+    LOG_PATH = log_path or LOG_PATH
+    PROFILE = profile
+
+# ==========================================
+# RECORDING (cheap no-ops outside a measured stage)
+# ==========================================
+def count(name, n=1):
+    """Adds n to a counter of the running stage, e.g. count('crop_cache.hit')."""
+    if _current is not None:
+        counters = _current['counters']
+        counters[name] = counters.get(name, 0) + int(n)
+
+def rows(name, n):
+    """Sets a row count of the running stage, e.g. rows('output', len(df))."""
+    if _current is not None:
+        _current['rows'][name] = int(n)
+
+def hit_rates(counters):
+    """'<cache>.hit_rate' for every cache that has '<cache>.hit' / '<cache>.miss' counters."""
+    rates = {}
+    for name in counters:
+        if name.endswith('.hit'):
+            cache = name[:-4]
+            total = counters[name] + counters.get(cache + '.miss', 0)
+            rates[cache + '.hit_rate'] = round(counters[name] / total, 4) if total else None
+        elif name.endswith('.miss') and name[:-5] + '.hit' not in counters:
+            rates[name[:-5] + '.hit_rate'] = 0.0
+    return rates
+
+def children_cpu():
+    """CPU seconds used by finished child (worker) processes so far (None without resource)."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def peak_rss_mb():
+    """
+    Peak resident set size so far of this process and of the largest finished worker (MB).
+    A high-water mark: a stage's value is the peak of the run up to the end of that stage.
+    (None, None) where the resource module is missing (Windows).
+    """
+    if resource is None:
+        return None, None
+    scale = 1 if sys.platform == 'darwin' else 1024   # ru_maxrss is bytes on macOS, KB on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 1e6
+    return round(own, 1), round(children, 1)
+
+def write(record, log_path=None):
+    log_path = log_path or LOG_PATH
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, 'a') as f:
+        f.write(json.dumps(record) + "\n")
+
+# ==========================================
+# STAGE MEASUREMENT
+# ==========================================
+@contextlib.contextmanager
+def stage(name, **fields):
+    """
+    Measures the enclosed block as one stage and appends a JSON line to LOG_PATH:
+    wall / CPU seconds, peak RSS, row counts and cache hit rates reported through
+    count() / rows() while it runs. With PROFILE on, a cProfile dump goes to
+    PROFILE_DIR/<name>.prof. Does nothing at all when metrics are disabled.
+    """
+    global _current
+    if not ENABLED or _current is not None:
+        yield
+        return
+
+    record = {'stage': name, 'started': time.strftime('%Y-%m-%dT%H:%M:%S'), **fields,
+              'rows': {}, 'counters': {}}
+    _current = record
+    profiler = cProfile.Profile() if PROFILE else None
+    wall, cpu, workers_cpu = time.perf_counter(), time.process_time(), children_cpu()
+    status = 'ok'
+    try:
+        if profiler:
+            profiler.enable()
+        yield record
+    except BaseException as e:
+        status = f"failed: {type(e).__name__}"
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        _current = None
+        own, children = peak_rss_mb()
+        workers_cpu = None if workers_cpu is None else round(children_cpu() - workers_cpu, 4)
+        record.update({
+            'status': status,
+            'wall_s': round(time.perf_counter() - wall, 4),
+            'cpu_s': round(time.process_time() - cpu, 4),
+            'cpu_workers_s': workers_cpu,
+            'peak_rss_mb': own,
+            'peak_rss_workers_mb': children,
+            **hit_rates(record['counters'])
+        })
+        if profiler:
+            os.makedirs(PROFILE_PATH, exist_ok=True)
+            record['profile'] = os.path.join(PROFILE_PATH, f"{name}.prof")
+            profiler.dump_stats(record['profile'])
+        write(record)
+
+def summary(log_path=None):
+    """Latest record per stage from the metrics log (for a quick look after a run)."""
+    log_path = log_path or LOG_PATH
+    if not os.path.exists(log_path):
+        return {}
+    latest = {}
+    with open(log_path) as f:
+        for line in f:
+            record = json.loads(line)
+            latest[record['stage']] = record
+    return latest
@@ -0,0 +1,471 @@
+import pandas as pd
+import numpy as np
+import calendar
+import hashlib
+import io
+import json
+import os
+from tqdm import tqdm
+from src.config import (WEATHER_DATA_DIR, WEATHER_CELL_DIR, WEATHER_LINKS, SEASON_WINDOWS,
+                        WEATHER_CUBE, WEATHER_CUBE_INDEX, WEATHER_VARIABLES, WEATHER_ANNUAL, WEATHER_FILL_VALUE,
+                        AUDIT_MIN_COVERAGE)
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+WEATHER_DIR = WEATHER_DATA_DIR
+CELL_DIR = WEATHER_CELL_DIR
+LINKS_PATH = WEATHER_LINKS
+CUBE_PATH = WEATHER_CUBE
+INDEX_PATH = WEATHER_CUBE_INDEX
+ANNUAL_PATH = WEATHER_ANNUAL
+VARIABLES = WEATHER_VARIABLES
+FILL_VALUE = WEATHER_FILL_VALUE
+WINDOWS = SEASON_WINDOWS
+MIN_COVERAGE = AUDIT_MIN_COVERAGE
+# Bump ANNUAL_VERSION when the yearly aggregation changes so every cached row is recomputed
+ANNUAL_VERSION = 2
+FILE_COLUMNS = ['Last_Date', 'File_Size', 'File_Mtime', 'File_Hash', 'Version']
+ANNUAL_COLUMNS = ['Source', 'Year', 'Avg_Temp', 'Total_Rainfall', 'Avg_Humidity'] + FILE_COLUMNS
+
+def full_period_rain(total, days, expected):
+    """
+    Rain total scaled to the whole period: a year or window with a few missing / fill-value days
+    is scaled by expected / valid days instead of summing fewer days (which biased it low).
+    Below MIN_COVERAGE the plain sum is kept; the audit grades those years 'bad' and the merge skips them.
+    """
+    total, days, expected = (np.asarray(v, dtype=np.float64) for v in (total, days, expected))
+    scale = np.ones_like(total)
+    fill = (days > 0) & (days < expected) & (days >= MIN_COVERAGE * expected)
+    np.divide(expected, days, out=scale, where=fill)
+    return total * scale
+
+def year_days(years):
+    return np.array([366 if calendar.isleap(int(y)) else 365 for y in years])
+
+# ==========================================
+# LOADER
+# ==========================================
+class WeatherCube:
+    """
+    Read-only view over the packed weather array.
+    data has shape (series, day, variable). Every accessor returns a slice of
+    the memory map, so nothing is read from disk until the values are used.
+    positions maps each district key to its series row; districts that share a
+    NASA grid cell point at the same row.
+    """
+    def __init__(self, data, positions, start_date):
+        self.data = data
+        self.positions = dict(positions)
+        self.districts = list(self.positions)
+        self.dates = np.arange(np.datetime64(start_date, 'D'), np.datetime64(start_date, 'D') + data.shape[1])
+        self.variables = list(VARIABLES)
+        self._prefix = None
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    def district(self, key):
+        """(day, variable) slice for one district, e.g. key = "pune_maharashtra"."""
+        if key not in self.positions:
+            return None
+        return self.data[self.positions[key]]
+
+    def variable(self, name):
+        """(series, day) slice for one variable, e.g. name = "Rain"."""
+        return self.data[:, :, self.variables.index(name)]
+
+    def window(self, start, end):
+        """(series, day, variable) slice between two dates (inclusive)."""
+        i = int(np.searchsorted(self.dates, np.datetime64(start, 'D'), side='left'))
+        j = int(np.searchsorted(self.dates, np.datetime64(end, 'D'), side='right'))
+        return self.data[:, i:j, :]
+
+    def to_frame(self, key):
+        """Same layout as the raw CSV (T2M, Rain, Humidity) with a 'Date' column."""
+        values = self.district(key)
+        if values is None:
+            return None
+        df = pd.DataFrame(values, columns=self.variables)
+        df['Date'] = self.dates
+        return df.dropna(how='all', subset=self.variables)
+
+    def annual_table(self, keys=None):
+        """
+        Yearly Avg_Temp / Total_Rainfall / Avg_Humidity for the requested districts.
+        Same layout as data_merger.load_annual_weather: one row per (Weather_Key, Year).
+        """
+        if keys is None:
+            keys = self.districts
+        keys = [k for k in dict.fromkeys(keys) if k in self.positions]
+        if not keys:
+            return pd.DataFrame(columns=['Weather_Key', 'Year', 'Avg_Temp', 'Total_Rainfall', 'Avg_Humidity'])
+
+        # Aggregate each stored series once, then fan out to the districts linked to it
+        rows, inverse = np.unique([self.positions[k] for k in keys], return_inverse=True)
+        block = self.data[rows]
+
+        # Day ranges of each calendar year (dates are contiguous and sorted)
+        years = self.dates.astype('datetime64[Y]').astype(int) + 1970
+        starts = np.r_[0, np.flatnonzero(np.diff(years)) + 1]
+
+        valid = ~np.isnan(block)
+        sums = np.add.reduceat(np.where(valid, block, 0).astype(np.float64), starts, axis=1)[inverse]
+        counts = np.add.reduceat(valid, starts, axis=1)[inverse]
+
+        t, r, h = (self.variables.index(v) for v in ['T2M', 'Rain', 'Humidity'])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            annual = pd.DataFrame({
+                'Weather_Key': np.repeat(keys, len(starts)),
+                'Year': np.tile(years[starts], len(keys)),
+                'Avg_Temp': (sums[:, :, t] / counts[:, :, t]).ravel(),
+                'Total_Rainfall': full_period_rain(sums[:, :, r], counts[:, :, r],
+                                                   year_days(years[starts])[None, :]).ravel(),
+                'Avg_Humidity': (sums[:, :, h] / counts[:, :, h]).ravel(),
+                'Days': counts.max(axis=2).ravel()
+            })
+
+        # A year with no daily rows at all is "no data", same as the CSV path
+        annual = annual[annual['Days'] > 0].drop(columns=['Days'])
+        return annual.reset_index(drop=True)
+
+    def prefix_sums(self):
+        """
+        Cumulative (sum, count) of every series over days, shape (series, day + 1, variable).
+        The total of days i..j is sums[:, j + 1] - sums[:, i], so any window costs two lookups.
+        Built once per cube (NaN days add 0 to the sum and the count).
+        """
+        if self._prefix is None:
+            valid = ~np.isnan(self.data)
+            shape = (self.data.shape[0], self.data.shape[1] + 1, self.data.shape[2])
+            sums = np.zeros(shape, dtype=np.float64)
+            counts = np.zeros(shape, dtype=np.int32)
+            np.cumsum(np.where(valid, self.data, 0), axis=1, dtype=np.float64, out=sums[:, 1:])
+            np.cumsum(valid, axis=1, dtype=np.int32, out=counts[:, 1:])
+            self._prefix = (sums, counts)
+        return self._prefix
+
+    def window_table(self, keys, starts, ends):
+        """
+        Avg_Temp / Total_Rainfall / Avg_Humidity of each (key, start date, end date) triple,
+        in the order given. Unknown districts, windows outside the cube and windows without
+        any data come back as NaN. Rain of windows with a few missing days is scaled to the window.
+        A window that runs past the last day of the cube (e.g. the Rabi season of the latest
+        crop year) is cut at that day and marked True in the Partial column.
+        """
+        keys = np.asarray(keys, dtype=object)
+        starts = np.asarray(starts, dtype='datetime64[D]')
+        ends = np.asarray(ends, dtype='datetime64[D]')
+        sums, counts = self.prefix_sums()
+
+        rows = np.array([self.positions.get(k, -1) for k in keys], dtype=np.int64)
+        n_days = len(self.dates)
+        i = (starts - self.dates[0]).astype(np.int64)
+        j = (ends - self.dates[0]).astype(np.int64) + 1
+        ok = (rows >= 0) & (i >= 0) & (i < n_days) & (i < j)
+        partial = ok & (j > n_days)
+        length = np.where(ok, j - i, 0)
+        rows, i, j = np.where(ok, rows, 0), np.where(ok, i, 0), np.where(ok, np.minimum(j, n_days), 0)
+
+        total = sums[rows, j] - sums[rows, i]
+        days = counts[rows, j] - counts[rows, i]
+        t, r, h = (self.variables.index(v) for v in ['T2M', 'Rain', 'Humidity'])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            table = pd.DataFrame({
+                'Avg_Temp': total[:, t] / days[:, t],
+                'Total_Rainfall': np.where(days[:, r] > 0, full_period_rain(total[:, r], days[:, r], length), np.nan),
+                'Avg_Humidity': total[:, h] / days[:, h]
+            })
+        table.loc[~ok] = np.nan
+        table['Partial'] = partial & (days.max(axis=1) > 0)
+        return table
+
+def season_bounds(seasons, years, windows=None):
+    """
+    First and last day of each crop season's weather window (datetime64[D] arrays).
+    years are crop years (2015 for "2015-16"); windows maps a season name to its
+    (start month, end month), see config.SEASON_WINDOWS.
+    """
+    windows = windows or WINDOWS
+    fallback = windows['Whole Year']
+    months = pd.Series(seasons).astype(str).str.strip().map(lambda s: windows.get(s, fallback))
+    start_month = np.array([m[0] for m in months], dtype=np.int64)
+    end_month = np.array([m[1] for m in months], dtype=np.int64)
+    years = np.asarray(years, dtype=np.int64)
+
+    end_year = years + (end_month < start_month)
+    start = ((years - 1970) * 12 + start_month - 1).astype('datetime64[M]').astype('datetime64[D]')
+    end = ((end_year - 1970) * 12 + end_month).astype('datetime64[M]').astype('datetime64[D]') - 1
+    return start, end
+
+
+def load_cube(cube_path=None, index_path=None, weather_dir=None, sources=None):
+    """
+    Opens the packed cube as a read-only memory map. Returns None if it was never built or
+    is out of date: a weather file was added, linked differently or changed (size / mtime)
+    since build_cube, e.g. after a fetch. sources (from weather_sources) saves listing them again.
+    """
+    cube_path = cube_path or CUBE_PATH
+    index_path = index_path or INDEX_PATH
+    if not (os.path.exists(cube_path) and os.path.exists(index_path)):
+        return None
+    with open(index_path) as f:
+        index = json.load(f)
+    weather_dir = weather_dir or WEATHER_DIR
+    if sources is None:
+        sources = weather_sources(weather_dir)
+    if (index.get('keys'), index.get('files')) != source_states(sources, weather_dir):
+        print("[INFO] Weather cube is older than the weather files; not using it.")
+        return None
+    data = np.load(cube_path, mmap_mode='r')
+    return WeatherCube(data, index['districts'], index['start_date'])
+
+# ==========================================
+# DISTRICT -> FILE RESOLUTION
+# ==========================================
+def load_links(links_path=None):
+    """{weather_key: cell_id} written by the fetcher. Empty if there is no link file yet."""
+    links_path = links_path or LINKS_PATH
+    if not os.path.exists(links_path):
+        return {}
+    links = pd.read_csv(links_path, dtype=str).dropna(subset=['weather_key', 'cell_id'])
+    return dict(zip(links['weather_key'], links['cell_id']))
+
+def weather_sources(weather_dir=None, cell_dir=None, links_path=None):
+    """
+    Maps every weather_key ("pune_maharashtra") to the CSV holding its series.
+    Grid-cell files (through weather_links.csv) take priority over older per-district files.
+    """
+    weather_dir = weather_dir or WEATHER_DIR
+    cell_dir = cell_dir or CELL_DIR
+
+    sources = {}
+    if os.path.exists(weather_dir):
+        for fname in os.listdir(weather_dir):
+            if fname.endswith('.csv'):
+                sources[fname[:-4]] = os.path.join(weather_dir, fname)
+
+    cell_files = set(os.listdir(cell_dir)) if os.path.exists(cell_dir) else set()
+    for key, cell_id in load_links(links_path).items():
+        if f"{cell_id}.csv" in cell_files:
+            sources[key] = os.path.join(cell_dir, f"{cell_id}.csv")
+    return sources
+
+def source_states(sources, weather_dir=None):
+    """
+    ({weather_key: file}, {file: [size, mtime]}) with files relative to weather_dir:
+    what the cube index records to tell whether the cube still matches the weather files.
+    """
+    weather_dir = weather_dir or WEATHER_DIR
+    keys = {key: os.path.relpath(path, weather_dir) for key, path in sorted(sources.items())}
+    files = {}
+    for path in sorted(set(sources.values())):
+        try:
+            files[os.path.relpath(path, weather_dir)] = list(file_state(path))
+        except OSError:
+            continue
+    return keys, files
+
+# ==========================================
+# INGEST
+# ==========================================
+def read_weather_csv(file_path):
+    """
+    Reads one NASA file. The first (unnamed) column holds integer dates like 20150101.
+    Fill values (-999) come back as NaN.
+    """
+    df = pd.read_csv(file_path, na_values={v: [FILL_VALUE] for v in VARIABLES})
+    df['Date'] = pd.to_datetime(df.iloc[:, 0].astype(str), format='%Y%m%d')
+    return df
+
+def read_last_date(file_path):
+    """
+    Watermark of a weather file: the integer date (YYYYMMDD) of its final row.
+    Only the end of the file is read. Returns None for an empty file.
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - 512))
+        lines = f.read().decode('utf-8', errors='ignore').strip().splitlines()
+    if not lines:
+        return None
+    last = lines[-1].split(',')[0].strip()
+    return int(last) if last.isdigit() else None
+
+# ==========================================
+# YEARLY AGGREGATES (incremental)
+# ==========================================
+def file_state(file_path):
+    """(size, mtime in ns) of a file: cheap to read, changes whenever the file is rewritten."""
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+def aggregate_years(data, from_year=None):
+    """Yearly Avg_Temp / Total_Rainfall / Avg_Humidity of one weather file's bytes (fill values as NaN)."""
+    df = pd.read_csv(io.BytesIO(data), na_values={v: [FILL_VALUE] for v in VARIABLES})
+    df['Year'] = df.iloc[:, 0].astype(int) // 10000
+    if from_year is not None:
+        df = df[df['Year'] >= from_year]
+    annual = df.groupby('Year', sort=True).agg(
+        Avg_Temp=('T2M', 'mean'),
+        Total_Rainfall=('Rain', 'sum'),
+        Rain_Days=('Rain', 'count'),
+        Avg_Humidity=('Humidity', 'mean')
+    ).reset_index()
+    annual['Total_Rainfall'] = full_period_rain(annual['Total_Rainfall'], annual['Rain_Days'], year_days(annual['Year']))
+    return annual.drop(columns=['Rain_Days'])
+
+def annual_for_files(file_paths, weather_dir=None, annual_path=None):
+    """
+    Yearly Avg_Temp / Total_Rainfall / Avg_Humidity per weather file, starting from the persisted
+    weather_annual.csv. Every file's rows carry the size, mtime and SHA-256 of the file they were
+    computed from (and ANNUAL_VERSION):
+      - same size and mtime -> rows reused without reading the file
+      - same content hash -> rows reused (file only touched)
+      - old content is an exact prefix (the fetcher appended a tail) -> years from the old
+        watermark (Last_Date) onwards recomputed
+      - anything else (fill values, re-downloaded gaps, a rewritten file) -> whole file recomputed
+    Nothing is written. Returns (table, number of files whose rows changed).
+    """
+    weather_dir = weather_dir or WEATHER_DIR
+    annual_path = annual_path or ANNUAL_PATH
+
+    cached = {}
+    if os.path.exists(annual_path):
+        old = pd.read_csv(annual_path)
+        if set(FILE_COLUMNS) <= set(old.columns):
+            old = old[old['Version'] == ANNUAL_VERSION]
+            cached = {source: rows for source, rows in old.groupby('Source', sort=False)}
+
+    frames, refreshed = [], 0
+    for file_path in file_paths:
+        source = os.path.relpath(file_path, weather_dir)
+        old = cached.get(source)
+        try:
+            size, mtime = file_state(file_path)
+            if old is not None and (old['File_Size'].iloc[0], old['File_Mtime'].iloc[0]) == (size, mtime):
+                frames.append(old)
+                continue
+            with open(file_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            continue
+        digest = hashlib.sha256(data).hexdigest()
+
+        annual, from_year = None, None
+        if old is not None and old['File_Hash'].iloc[0] == digest:
+            annual = old.copy()
+        elif (old is not None and size > old['File_Size'].iloc[0]
+              and hashlib.sha256(data[:int(old['File_Size'].iloc[0])]).hexdigest() == old['File_Hash'].iloc[0]):
+            # Years before the old watermark's year are unaffected by an appended tail
+            from_year = int(old['Last_Date'].iloc[0]) // 10000
+        if annual is None:
+            try:
+                annual = aggregate_years(data, from_year)
+            except Exception:
+                continue
+            annual.insert(0, 'Source', source)
+            if from_year is not None:
+                annual = pd.concat([old[old['Year'] < from_year], annual], ignore_index=True)
+
+        annual['Last_Date'] = read_last_date(file_path)
+        annual['File_Size'], annual['File_Mtime'] = size, mtime
+        annual['File_Hash'], annual['Version'] = digest, ANNUAL_VERSION
+        frames.append(annual[ANNUAL_COLUMNS])
+        refreshed += 1
+
+    table = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=ANNUAL_COLUMNS)
+    return table, refreshed
+
+def store_annual_table(table, annual_path=None):
+    """Persists the rows of the files in table, keeping the rows of every other file."""
+    annual_path = annual_path or ANNUAL_PATH
+    keep = []
+    if os.path.exists(annual_path):
+        old = pd.read_csv(annual_path)
+        keep = [old[~old['Source'].isin(set(table['Source']))]]
+    os.makedirs(os.path.dirname(annual_path), exist_ok=True)
+    tmp_path = annual_path + ".tmp"
+    pd.concat(keep + [table], ignore_index=True).to_csv(tmp_path, index=False)
+    os.replace(tmp_path, annual_path)
+
+def update_annual_table(file_paths, weather_dir=None, annual_path=None):
+    """
+    annual_for_files + persisting the result when any file was recomputed.
+    Returns one row per (Source, Year); Source is the path relative to the weather folder.
+    """
+    table, refreshed = annual_for_files(file_paths, weather_dir, annual_path)
+    if refreshed:
+        print(f"[INFO] Recomputed yearly weather for {refreshed} of {table['Source'].nunique()} files.")
+        store_annual_table(table, annual_path)
+    return table
+
+def build_cube(weather_dir=None, cube_path=None, index_path=None):
+    """
+    Packs every weather file (grid cells and per-district CSVs) into one float32 array
+    (series x day x variable). Days missing from a file are stored as NaN.
+    """
+    weather_dir = weather_dir or WEATHER_DIR
+    cube_path = cube_path or CUBE_PATH
+    index_path = index_path or INDEX_PATH
+
+    if not os.path.exists(weather_dir):
+        print(f"[ERROR] Weather folder not found at {weather_dir}")
+        return None
+
+    sources = weather_sources(weather_dir)
+    files = sorted(set(sources.values()))
+    print(f"[INFO] Packing {len(files)} weather files for {len(sources)} districts...")
+
+    series = {}
+    for file_path in tqdm(files):
+        try:
+            series[file_path] = read_weather_csv(file_path)
+        except Exception as e:
+            print(f"[WARN] Skipping {file_path}: {e}")
+
+    if not series:
+        print("[ERROR] No readable weather files.")
+        return None
+
+    start = min(df['Date'].min() for df in series.values()).to_datetime64().astype('datetime64[D]')
+    end = max(df['Date'].max() for df in series.values()).to_datetime64().astype('datetime64[D]')
+    n_days = int((end - start).astype(int)) + 1
+    files = list(series.keys())
+    rows = {file_path: i for i, file_path in enumerate(files)}
+    positions = {key: rows[path] for key, path in sorted(sources.items()) if path in rows}
+
+    # Write through a temporary file so readers never see a half-built cube
+    os.makedirs(os.path.dirname(cube_path), exist_ok=True)
+    tmp_path = cube_path + ".tmp.npy"
+    cube = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32,
+                                     shape=(len(files), n_days, len(VARIABLES)))
+    cube[:] = np.nan
+
+    for i, file_path in enumerate(files):
+        df = series[file_path]
+        day = (df['Date'].values.astype('datetime64[D]') - start).astype(int)
+        cube[i, day, :] = df[VARIABLES].to_numpy(dtype=np.float32)
+
+    cube.flush()
+    del cube
+    os.replace(tmp_path, cube_path)
+
+    keys, states = source_states(sources, weather_dir)
+    with open(index_path, 'w') as f:
+        json.dump({
+            'sources': [os.path.relpath(f, weather_dir) for f in files],
+            'keys': keys,
+            'files': states,
+            'districts': positions,
+            'start_date': str(start),
+            'n_days': n_days,
+            'variables': VARIABLES
+        }, f)
+
+    print(f"[SUCCESS] Cube saved to {cube_path} ({len(positions)} districts, {len(files)} series x {n_days} days)")
+    return load_cube(cube_path, index_path, weather_dir, sources)
+
+if __name__ == "__main__":
+    build_cube()
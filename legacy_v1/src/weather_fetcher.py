@@ -1,40 +1,160 @@
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
 import os
+import json
+import random
+import shutil
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
-from src.config import DISTRICT_MAPPING, WEATHER_DATA_DIR, WEATHER_START_YEAR, WEATHER_END_YEAR
+from src.weather_cube import read_last_date
+from src.config import (DISTRICT_MAPPING, WEATHER_DATA_DIR, WEATHER_CELL_DIR, WEATHER_LINKS,
+                        WEATHER_START_YEAR, WEATHER_END_YEAR, WEATHER_GRID_LAT, WEATHER_GRID_LON,
+                        WEATHER_FILL_VALUE, WEATHER_MANIFEST, FETCH_WORKERS, FETCH_RATE_PER_SEC, FETCH_BURST, FETCH_MAX_RETRIES)
 
 
 INPUT_COORDS = DISTRICT_MAPPING
 OUTPUT_FOLDER = WEATHER_DATA_DIR
+CELL_FOLDER = WEATHER_CELL_DIR
+LINKS_PATH = WEATHER_LINKS
+MANIFEST_PATH = WEATHER_MANIFEST
 BASE_URL = "https://power.larc.nasa.gov/api/temporal/daily/point"
 
-def fetch_weather():
-    if not os.path.exists(INPUT_COORDS): return
-    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+# HTTP codes worth retrying (throttled / server side hiccups)
+RETRY_STATUS = {429, 500, 502, 503, 504}
 
-    districts = pd.read_csv(INPUT_COORDS).dropna(subset=['latitude', 'longitude'])
+# NASA POWER marks days it doesn't have yet with this fill value
+FILL_VALUE = WEATHER_FILL_VALUE
+
+# ==========================================
+# RATE LIMITING
+# ==========================================
+class TokenBucket:
+    """
+    Shared limiter for all workers: `rate` tokens per second, up to `capacity` saved up.
+    acquire() blocks until a token is available.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# ==========================================
+# MANIFEST (resume state per grid cell)
+# ==========================================
+class Manifest:
+    """
+    JSON file of {cell_id: {"status", "attempts", "error", "last_date", "updated"}}.
+    Status is "done" or "failed"; last_date (YYYYMMDD) is the cell's watermark.
+    Rewritten atomically after every cell.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.entries = json.load(f)
+            except (ValueError, OSError):
+                print(f"[WARN] Manifest unreadable, starting fresh: {path}")
+
+    def last_date(self, key):
+        return self.entries.get(key, {}).get('last_date')
+
+    def record(self, key, status, attempts, error=None, last_date=None, save=True):
+        with self.lock:
+            previous = self.entries.get(key, {})
+            self.entries[key] = {
+                'status': status,
+                'attempts': attempts,
+                'error': error,
+                'last_date': last_date if last_date is not None else previous.get('last_date'),
+                'updated': time.strftime('%Y-%m-%dT%H:%M:%S')
+            }
+            if save:
+                self._save()
 
-    print(f"Fetching weather for {len(districts)} locations...")
+    def save(self):
+        with self.lock:
+            self._save()
 
-    for idx, row in tqdm(districts.iterrows(), total=len(districts)):
-        safe_name = f"{row['district_name']}_{row['state_name']}".replace(" ", "_").lower()
-        fname = os.path.join(OUTPUT_FOLDER, f"{safe_name}.csv")
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(tmp_path, self.path)
 
-        if os.path.exists(fname): continue
+# ==========================================
+# LOGIC
+# ==========================================
+def assign_grid_cells(districts):
+    """
+    Snaps every district to the centre of its NASA POWER grid cell.
+    Adds weather_key, cell_id, cell_lat, cell_lon columns.
+    """
+    districts = districts.copy()
+    districts['weather_key'] = (districts['district_name'].astype(str) + "_" + districts['state_name'].astype(str)).str.replace(" ", "_").str.lower()
+    districts['cell_lat'] = ((districts['latitude'] / WEATHER_GRID_LAT).round() * WEATHER_GRID_LAT).round(4)
+    districts['cell_lon'] = ((districts['longitude'] / WEATHER_GRID_LON).round() * WEATHER_GRID_LON).round(4)
+    districts['cell_id'] = districts['cell_lat'].map('{:.3f}'.format) + "_" + districts['cell_lon'].map('{:.3f}'.format)
+    return districts
 
-        params = {
-            "parameters": "T2M,PRECTOTCORR,RH2M",
-            "community": "AG",
-            "longitude": row['longitude'],
-            "latitude": row['latitude'],
-            "start": "20150101", "end": "20231231",
-            "format": "JSON"
-        }
+def save_links(districts):
+    """Writes the district -> grid cell table that data_merger and the cube resolve through."""
+    os.makedirs(os.path.dirname(LINKS_PATH), exist_ok=True)
+    cols = ['state_name', 'district_name', 'weather_key', 'cell_id', 'cell_lat', 'cell_lon']
+    tmp_path = LINKS_PATH + ".tmp"
+    districts[cols].to_csv(tmp_path, index=False)
+    os.replace(tmp_path, LINKS_PATH)
 
+def make_session(pool_size):
+    # One pooled session shared by every worker (keep-alive, no per-request TLS handshake)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def next_day(yyyymmdd):
+    return (pd.Timestamp(str(yyyymmdd)) + pd.Timedelta(days=1)).strftime('%Y%m%d')
+
+def download_point(session, limiter, lat, lon, start, end, base_url, max_retries):
+    """
+    Downloads one grid point for start..end (YYYYMMDD) with retries + exponential backoff.
+    Returns (DataFrame or None, attempts, error message).
+    """
+    params = {
+        "parameters": "T2M,PRECTOTCORR,RH2M",
+        "community": "AG",
+        "longitude": lon,
+        "latitude": lat,
+        "start": start, "end": end,
+        "format": "JSON"
+    }
+
+    error = None
+    for attempt in range(1, max_retries + 1):
+        limiter.acquire()
         try:
-            response = requests.get(BASE_URL, params=params)
+            response = session.get(base_url, params=params, timeout=60)
             if response.status_code == 200:
                 data = response.json()['properties']['parameter']
                 df = pd.DataFrame({
@@ -42,11 +162,114 @@ def fetch_weather():
                     'Rain': data['PRECTOTCORR'],
                     'Humidity': data['RH2M']
                 })
-                df.to_csv(fname)
-        except Exception as e:
-            print(f"Error {row['district_name']}: {e}")
+                return df, attempt, None
+            error = f"HTTP {response.status_code}"
+            if response.status_code not in RETRY_STATUS:
+                break
+        except (requests.RequestException, ValueError, KeyError) as e:
+            error = str(e)
+
+        # Backoff: 1s, 2s, 4s ... plus jitter so workers don't retry in lockstep
+        if attempt < max_retries:
+            time.sleep(min(30, 2 ** (attempt - 1)) + random.uniform(0, 0.5))
+
+    return None, attempt, error
+
+def fetch_weather(base_url=BASE_URL, workers=FETCH_WORKERS, rate=FETCH_RATE_PER_SEC,
+                  burst=FETCH_BURST, max_retries=FETCH_MAX_RETRIES, end=None):
+    """
+    Brings every grid cell up to `end` (YYYYMMDD, default Dec 31 of WEATHER_END_YEAR).
+    Each cell file has a watermark (its last date); only the missing tail is requested
+    and appended, so extending the series never re-downloads earlier years.
+    """
+    if not os.path.exists(INPUT_COORDS): return
+    os.makedirs(CELL_FOLDER, exist_ok=True)
+    start = f"{WEATHER_START_YEAR}0101"
+    end = str(end or f"{WEATHER_END_YEAR}1231")
+
+    districts = pd.read_csv(INPUT_COORDS).dropna(subset=['latitude', 'longitude'])
+    districts = assign_grid_cells(districts)
+    save_links(districts)
+    manifest = Manifest(MANIFEST_PATH)
+
+    # Neighbouring districts in the same cell share a single download
+    cells = districts.groupby('cell_id').agg(
+        cell_lat=('cell_lat', 'first'),
+        cell_lon=('cell_lon', 'first'),
+        keys=('weather_key', list)
+    )
+
+    jobs = []
+    for cell_id, cell in cells.iterrows():
+        fname = os.path.join(CELL_FOLDER, f"{cell_id}.csv")
+
+        # Seed a new cell file by moving an older per-district download of the same cell into it.
+        # Once the cell file exists the links point every district of the cell at it, so the
+        # remaining per-district files are unused and removed
+        legacy = [os.path.join(OUTPUT_FOLDER, f"{key}.csv") for key in cell['keys']]
+        legacy = [path for path in legacy if os.path.exists(path)]
+        if legacy and not os.path.exists(fname):
+            os.replace(legacy.pop(0), fname)
+        if os.path.exists(fname):
+            for legacy_path in legacy:
+                os.remove(legacy_path)
+
+        # Watermark: manifest first, file tail as a fallback (e.g. manifest deleted)
+        watermark = None
+        if os.path.exists(fname):
+            watermark = manifest.last_date(cell_id) or read_last_date(fname)
+        cell_start = next_day(watermark) if watermark else start
+
+        if cell_start > end:
+            manifest.record(cell_id, 'done', 0, last_date=watermark, save=False)
+            continue
+        jobs.append((cell_id, fname, cell['cell_lat'], cell['cell_lon'], cell_start))
+    manifest.save()
+
+    print(f"{len(districts)} districts map to {len(cells)} grid cells.")
+    print(f"Fetching weather up to {end} for {len(jobs)} cells ({len(cells) - len(jobs)} already up to date)...")
+    if not jobs:
+        return
+
+    limiter = TokenBucket(rate, burst)
+    session = make_session(workers)
+
+    def work(cell_id, fname, lat, lon, cell_start):
+        df, attempts, error = download_point(session, limiter, lat, lon, cell_start, end, base_url, max_retries)
+        if df is None:
+            manifest.record(cell_id, 'failed', attempts, error)
+            return cell_id, error
+
+        # Drop trailing days NASA hasn't published yet so they are requested again next run
+        published = ~(df == FILL_VALUE).all(axis=1)
+        df = df.loc[:published[::-1].idxmax()] if published.any() else df.iloc[0:0]
+        if df.empty:
+            manifest.record(cell_id, 'done', attempts)
+            return cell_id, None
+
+        # Write to a temp file first so an interrupted run never leaves a half CSV behind
+        tmp_path = fname + ".part"
+        if os.path.exists(fname):
+            # Existing history + only the new tail
+            shutil.copyfile(fname, tmp_path)
+            df.to_csv(tmp_path, mode='a', header=False)
+        else:
+            df.to_csv(tmp_path)
+        os.replace(tmp_path, fname)
+        manifest.record(cell_id, 'done', attempts, last_date=int(df.index[-1]))
+        return cell_id, None
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(work, *job) for job in jobs]
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            cell_id, error = future.result()
+            if error:
+                failed += 1
+                print(f"Error cell {cell_id}: {error}")
 
-        time.sleep(1.2) # Rate limit
+    session.close()
+    print(f"[DONE] {len(jobs) - failed} updated, {failed} failed (see {MANIFEST_PATH})")
 
 if __name__ == "__main__":
-    fetch_weather()
\ No newline at end of file
+    fetch_weather()
@@ -0,0 +1,39 @@
+import pandas as pd
+import os
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+LEGACY_DATA_DIR = os.path.join(BASE_DIR, "legacy_v1", "data")
+LEGACY_MODELS_DIR = os.path.join(BASE_DIR, "legacy_v1", "models")
+
+# Written by the legacy pipeline (legacy_v1/src/clean_and_split.py): Parquet, Category=/Crop= partitions
+MODEL_READY_DATASET = os.path.join(LEGACY_DATA_DIR, "processed", "model_ready", "crops")
+YIELD_COL = 'Yield (Tonne/Hectare)'
+
+# ==========================================
+# LOADING
+# ==========================================
+def load_model_ready(path=None, crops=None, columns=None, filters=None):
+    """
+    Model-ready rows, optionally for some crops only (partition pruning), some columns only and
+    rows matching extra pyarrow filters, e.g. [('Year', 'in', [2019, 2020])].
+    Crop always comes back as a plain string column.
+    """
+    path = path or MODEL_READY_DATASET
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model-ready dataset not found at {path} (run legacy_v1/run_pipeline.py split)")
+    filters = ([('Crop', 'in', list(crops))] if crops else []) + list(filters or [])
+    if columns is not None:
+        columns = list(dict.fromkeys(['Crop'] + list(columns)))
+    df = pd.read_parquet(path, columns=columns, filters=filters or None)
+    df['Crop'] = df['Crop'].astype(str)
+    return df
+
+def as_frame(data, crops=None, columns=None):
+    """Accepts a DataFrame (used as is, filtered to crops) or a dataset path / None."""
+    if isinstance(data, pd.DataFrame):
+        df = data if crops is None else data[data['Crop'].astype(str).isin(crops)]
+        return df if columns is None else df[list(dict.fromkeys(['Crop'] + list(columns)))]
+    return load_model_ready(data, crops, columns)
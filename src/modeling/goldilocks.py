@@ -0,0 +1,149 @@
+import numpy as np
+import argparse
+import time
+from scipy import stats
+from src.modeling.datasets import as_frame, YIELD_COL
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+GROUP_KEYS = ['Crop', 'State']
+MIN_ROWS = 8            # groups with fewer usable rows are reported but not fitted
+CONFIDENCE = 0.95
+MAX_CONDITION = 1e10    # normal equations worse than this are treated as singular
+
+# ==========================================
+# BATCHED NORMAL EQUATIONS
+# ==========================================
+def group_scale(values, group, n_groups):
+    """Per-group mean and std of values (std 1 where a group has no spread)."""
+    count = np.bincount(group, minlength=n_groups)
+    mean = np.bincount(group, weights=values, minlength=n_groups) / np.maximum(count, 1)
+    var = np.bincount(group, weights=(values - mean[group]) ** 2, minlength=n_groups) / np.maximum(count, 1)
+    std = np.sqrt(var)
+    return mean, np.where(std > 0, std, 1.0)
+
+def design(rain_z, temp_z=None):
+    """[1, r, r^2] (+ [t, t^2]) on group-standardized values, so every group is equally well conditioned."""
+    columns = [np.ones_like(rain_z), rain_z, rain_z ** 2]
+    if temp_z is not None:
+        columns += [temp_z, temp_z ** 2]
+    return np.column_stack(columns)
+
+def group_sums(F, y, group, n_groups):
+    """X'X (G x p x p), X'y (G x p) and y'y (G) of every group in one pass over sorted rows."""
+    order = np.argsort(group, kind='stable')
+    F, y, group = F[order], y[order], group[order]
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    present = group[starts]
+    p = F.shape[1]
+
+    XtX = np.zeros((n_groups, p, p))
+    Xty = np.zeros((n_groups, p))
+    yty = np.zeros(n_groups)
+    XtX[present] = np.add.reduceat(F[:, :, None] * F[:, None, :], starts, axis=0)
+    Xty[present] = np.add.reduceat(F * y[:, None], starts, axis=0)
+    yty[present] = np.add.reduceat(y * y, starts)
+    return XtX, Xty, yty
+
+def solve_groups(XtX, Xty, yty, counts, y_sum):
+    """
+    Batched least squares from the sufficient statistics: coefficients, residual variance,
+    coefficient covariance and R2 for every group at once. Unfittable groups come back NaN.
+    """
+    G, p = Xty.shape
+    ok = counts >= max(MIN_ROWS, p + 1)
+    ok[ok] = np.linalg.cond(XtX[ok]) < MAX_CONDITION
+
+    beta = np.full((G, p), np.nan)
+    inverse = np.full((G, p, p), np.nan)
+    if ok.any():
+        inverse[ok] = np.linalg.inv(XtX[ok])
+        beta[ok] = np.einsum('gij,gj->gi', inverse[ok], Xty[ok])
+
+    # SSE = y'y - 2 b'X'y + b'X'X b ; SST = y'y - n * mean^2
+    sse = yty - 2 * np.einsum('gi,gi->g', beta, Xty) + np.einsum('gi,gij,gj->g', beta, XtX, beta)
+    sst = yty - y_sum ** 2 / np.maximum(counts, 1)
+    dof = np.maximum(counts - p, 1)
+    sigma2 = np.maximum(sse, 0) / dof
+    r2 = np.where(sst > 0, 1 - sse / np.where(sst > 0, sst, 1), np.nan)
+    return beta, inverse * sigma2[:, None, None], np.where(ok, r2, np.nan), dof
+
+# ==========================================
+# GOLDILOCKS TABLE
+# ==========================================
+def fit_groups(data=None, crops=None, with_temperature=False, by=None):
+    """
+    Quadratic rainfall response Yield = c + b*Rain + a*Rain^2 (+ temperature terms) for every
+    group (Crop x State by default) in one batched solve, as yield_pred_regression.ipynb does
+    for Sugarcane alone. Rows need Total_Rainfall > 0 and Yield > 0, as in the notebook.
+    Returns one row per group: Optimal_Rain = -b / 2a with delta-method confidence bounds,
+    Curvature (a, per mm^2; negative = a real peak), Peak_Yield, R2, N and In_Range (peak inside
+    the group's observed rainfall).
+    """
+    by = list(by or GROUP_KEYS)
+    columns = by + ['Total_Rainfall', YIELD_COL] + (['Avg_Temp'] if with_temperature else [])
+    df = as_frame(data, crops, columns)
+    df = df[(df['Total_Rainfall'] > 0) & (df[YIELD_COL] > 0)].dropna(subset=columns)
+
+    grouped = df.groupby([df[k].astype(str) for k in by], sort=True)
+    group = grouped.ngroup().to_numpy()
+    n_groups = grouped.ngroups
+    rain = df['Total_Rainfall'].to_numpy(dtype=np.float64)
+    y = df[YIELD_COL].to_numpy(dtype=np.float64)
+
+    rain_mean, rain_std = group_scale(rain, group, n_groups)
+    temp_z = None
+    if with_temperature:
+        temp = df['Avg_Temp'].to_numpy(dtype=np.float64)
+        temp_mean, temp_std = group_scale(temp, group, n_groups)
+        temp_z = (temp - temp_mean[group]) / temp_std[group]
+    F = design((rain - rain_mean[group]) / rain_std[group], temp_z)
+
+    counts = np.bincount(group, minlength=n_groups)
+    XtX, Xty, yty = group_sums(F, y, group, n_groups)
+    beta, cov, r2, dof = solve_groups(XtX, Xty, yty, counts, np.bincount(group, weights=y, minlength=n_groups))
+
+    # Vertex of the parabola in standardized rain (temperature held at the group mean)
+    c, b, a = beta[:, 0], beta[:, 1], beta[:, 2]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vertex = -b / (2 * a)
+        # Delta method: d(vertex)/db = -1/(2a), d(vertex)/da = b/(2a^2)
+        grad_b, grad_a = -1 / (2 * a), b / (2 * a ** 2)
+        vertex_se = np.sqrt(grad_b ** 2 * cov[:, 1, 1] + grad_a ** 2 * cov[:, 2, 2] + 2 * grad_a * grad_b * cov[:, 1, 2])
+    half_width = stats.t.ppf(0.5 + CONFIDENCE / 2, dof) * vertex_se
+
+    table = grouped.size().reset_index(name='N')
+    table['Mean_Rain'] = rain_mean
+    table['Curvature'] = a / rain_std ** 2
+    table['Optimal_Rain'] = rain_mean + rain_std * vertex
+    table['Optimal_Low'] = rain_mean + rain_std * (vertex - half_width)
+    table['Optimal_High'] = rain_mean + rain_std * (vertex + half_width)
+    table['Peak_Yield'] = c + b * vertex + a * vertex ** 2
+    table['R2'] = r2
+    table['Has_Peak'] = a < 0
+    # A peak outside the rainfall the group has actually seen is an extrapolation
+    observed = grouped['Total_Rainfall'].agg(['min', 'max']).to_numpy()
+    table['In_Range'] = table['Has_Peak'] & (table['Optimal_Rain'] >= observed[:, 0]) & (table['Optimal_Rain'] <= observed[:, 1])
+
+    # A parabola opening upwards has a minimum, not an optimum
+    no_peak = ~table['Has_Peak']
+    table.loc[no_peak, ['Optimal_Rain', 'Optimal_Low', 'Optimal_High', 'Peak_Yield']] = np.nan
+    return table
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimal rainfall ('Goldilocks zone') per crop and state.")
+    parser.add_argument('--crops', nargs='+', default=None)
+    parser.add_argument('--temperature', action='store_true', help="add Avg_Temp and Avg_Temp^2 terms")
+    parser.add_argument('--by', nargs='+', default=GROUP_KEYS, help="grouping columns (default: Crop State)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    table = fit_groups(crops=args.crops, with_temperature=args.temperature, by=args.by)
+    elapsed = time.perf_counter() - started
+    print("-" * 40)
+    print("GOLDILOCKS ZONES (groups with a rainfall peak)")
+    print("-" * 40)
+    print(table[table['Has_Peak']].sort_values(args.by).to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    print(f"\n[DONE] {len(table)} groups fitted in {elapsed:.3f}s "
+          f"({int(table['Has_Peak'].sum())} with a peak, {int(table['In_Range'].sum())} inside the observed rainfall)")
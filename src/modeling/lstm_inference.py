@@ -0,0 +1,305 @@
+import pandas as pd
+import numpy as np
+import argparse
+import json
+import os
+import sys
+import time
+from numpy.lib.stride_tricks import sliding_window_view
+import h5py
+from src.modeling import datasets
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+MODEL_PATH = os.path.join(datasets.LEGACY_MODELS_DIR, "price_lstm.h5")
+WINDOW = 60              # timesteps per input window (set to the window the model was trained on)
+BATCH_ROWS = 8192        # windows per forward pass; bounds the (rows x 4*units) gate buffer
+CHECK_ROWS = 64          # windows compared against the reference loop by check()
+CHECK_TOLERANCE = 1e-4   # float32 forward pass vs float64 reference
+
+# Layers without weights that are the identity at inference time
+PASSTHROUGH = {'InputLayer', 'Dropout', 'SpatialDropout1D', 'GaussianNoise', 'GaussianDropout', 'ActivityRegularization'}
+
+ACTIVATIONS = {
+    'linear': lambda z: z,
+    'tanh': np.tanh,
+    'sigmoid': lambda z: 0.5 * (np.tanh(0.5 * z) + 1),   # overflow-free logistic
+    'hard_sigmoid': lambda z: np.clip(0.2 * z + 0.5, 0, 1),   # Keras 2 definition (.h5 era)
+    'relu': lambda z: np.maximum(z, 0),
+}
+
+# ==========================================
+# 1. WEIGHTS (Keras HDF5 layout)
+# ==========================================
+def layer_configs(f):
+    """{layer name: (class_name, config)} from the file's model_config (empty for weights-only files)."""
+    raw = f.attrs.get('model_config')
+    if raw is None:
+        return {}
+    config = json.loads(raw.decode() if isinstance(raw, bytes) else raw)
+    layers = config.get('config', {})
+    layers = layers.get('layers', []) if isinstance(layers, dict) else layers
+    return {layer['config']['name']: (layer['class_name'], layer['config']) for layer in layers}
+
+def activation(name):
+    if name not in ACTIVATIONS:
+        raise ValueError(f"Unsupported activation '{name}'")
+    return ACTIVATIONS[name]
+
+def load_layers(path=None):
+    """
+    LSTM / Dense stack of a Keras .h5 file (full model or save_weights), in layer order:
+    [{'type': 'lstm' | 'dense' | 'activation', 'name', weights..., activations, return_sequences}].
+    Keras LSTM gate order is input, forget, cell, output along the 4*units axis.
+    """
+    path = path or MODEL_PATH
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model not found at {path}")
+    if os.path.getsize(path) == 0:
+        raise ValueError(f"{path} is an empty placeholder; save the trained Keras model there first")
+
+    layers = []
+    with h5py.File(path, 'r') as f:
+        configs = layer_configs(f)
+        group = f['model_weights'] if 'model_weights' in f else f
+        names = [n.decode() if isinstance(n, bytes) else n for n in group.attrs['layer_names']]
+        for name in names:
+            class_name, config = configs.get(name, (None, {}))
+            weight_names = [w.decode() if isinstance(w, bytes) else w for w in group[name].attrs['weight_names']]
+            weights = {}
+            for weight_name in weight_names:
+                leaf = weight_name.split('/')[-1].split(':')[0]
+                weights[leaf] = np.asarray(group[name][weight_name], dtype=np.float32)
+
+            if class_name in PASSTHROUGH or (class_name is None and not weights):
+                continue
+            if class_name == 'Activation':
+                layers.append({'type': 'activation', 'name': name, 'activation': activation(config['activation'])})
+            elif class_name == 'LSTM' or (class_name is None and 'recurrent_kernel' in weights):
+                units = weights['recurrent_kernel'].shape[0]
+                if config.get('go_backwards') or config.get('stateful'):
+                    raise ValueError(f"LSTM '{name}': go_backwards / stateful layers are not supported")
+                layers.append({'type': 'lstm', 'name': name, 'units': units,
+                               'kernel': weights['kernel'], 'recurrent_kernel': weights['recurrent_kernel'],
+                               'bias': weights.get('bias', np.zeros(4 * units, dtype=np.float32)),
+                               'activation': activation(config.get('activation', 'tanh')),
+                               'recurrent_activation': activation(config.get('recurrent_activation', 'sigmoid')),
+                               'return_sequences': config.get('return_sequences')})
+            elif class_name == 'Dense' or (class_name is None and set(weights) <= {'kernel', 'bias'} and weights):
+                layers.append({'type': 'dense', 'name': name, 'kernel': weights['kernel'],
+                               'bias': weights.get('bias', np.zeros(weights['kernel'].shape[1], dtype=np.float32)),
+                               'activation': activation(config.get('activation', 'linear'))})
+            else:
+                raise ValueError(f"Unsupported layer '{name}' ({class_name or sorted(weights)})")
+
+    # Weights-only files carry no config: every LSTM but the last feeds the next one a full sequence
+    lstms = [layer for layer in layers if layer['type'] == 'lstm']
+    for layer in lstms:
+        if layer['return_sequences'] is None:
+            layer['return_sequences'] = layer is not lstms[-1]
+    if not layers:
+        raise ValueError(f"No LSTM / Dense layers found in {path}")
+    return layers
+
+# ==========================================
+# 2. BATCHED FORWARD PASS
+# ==========================================
+def lstm_layer(X, layer):
+    """
+    One LSTM over a batch: X (rows, timesteps, features) -> (rows, units), or
+    (rows, timesteps, units) with return_sequences. Each timestep is one matrix product for
+    every row at once; the input projection of a step reads X[:, t] in place.
+    """
+    rows, steps, _ = X.shape
+    units = layer['units']
+    W, U, b = layer['kernel'], layer['recurrent_kernel'], layer['bias']
+    act, rec_act = layer['activation'], layer['recurrent_activation']
+
+    h = np.zeros((rows, units), dtype=np.float32)
+    c = np.zeros((rows, units), dtype=np.float32)
+    sequence = np.empty((rows, steps, units), dtype=np.float32) if layer['return_sequences'] else None
+    for t in range(steps):
+        z = X[:, t] @ W
+        z += h @ U
+        z += b
+        i, f, g, o = rec_act(z[:, :units]), rec_act(z[:, units:2 * units]), act(z[:, 2 * units:3 * units]), rec_act(z[:, 3 * units:])
+        c = f * c + i * g
+        h = o * act(c)
+        if sequence is not None:
+            sequence[:, t] = h
+    return sequence if sequence is not None else h
+
+def apply_layer(X, layer):
+    if layer['type'] == 'lstm':
+        return lstm_layer(X, layer)
+    if layer['type'] == 'dense':
+        return layer['activation'](X @ layer['kernel'] + layer['bias'])
+    return layer['activation'](X)
+
+def forward(layers, X, batch_rows=None):
+    """Model output for X (rows, timesteps, features), BATCH_ROWS windows per pass."""
+    batch_rows = batch_rows or BATCH_ROWS
+    outputs = []
+    for start in range(0, len(X), batch_rows):
+        out = np.asarray(X[start:start + batch_rows], dtype=np.float32)
+        for layer in layers:
+            out = apply_layer(out, layer)
+        outputs.append(out)
+    return np.concatenate(outputs) if outputs else np.empty((0,), dtype=np.float32)
+
+def reference_forward(layers, X):
+    """
+    The textbook LSTM equations, one window and one timestep at a time in float64: slow,
+    but independent of the batched code path. Used by check().
+    """
+    sigmoid = lambda v: 1 / (1 + np.exp(-v))
+    outputs = []
+    for window in np.asarray(X, dtype=np.float64):
+        out = window
+        for layer in layers:
+            if layer['type'] != 'lstm':
+                out = apply_layer(out.astype(np.float32), layer).astype(np.float64)
+                continue
+            units = layer['units']
+            W, U, b = (layer[k].astype(np.float64) for k in ('kernel', 'recurrent_kernel', 'bias'))
+            rec_act = sigmoid if layer['recurrent_activation'] is ACTIVATIONS['sigmoid'] else layer['recurrent_activation']
+            act = layer['activation']
+            h, c, states = np.zeros(units), np.zeros(units), []
+            for x in out:
+                gates = [x @ W[:, k * units:(k + 1) * units] + h @ U[:, k * units:(k + 1) * units] + b[k * units:(k + 1) * units]
+                         for k in range(4)]
+                c = rec_act(gates[1]) * c + rec_act(gates[0]) * act(gates[2])
+                h = rec_act(gates[3]) * act(c)
+                states.append(h)
+            out = np.array(states) if layer['return_sequences'] else h
+        outputs.append(out)
+    return np.array(outputs)
+
+def keras_forward(path, X):
+    """Output of the real Keras model, or None when Keras is not installed."""
+    try:
+        import keras
+    except ImportError:
+        return None
+    return np.asarray(keras.models.load_model(path, compile=False).predict(X, verbose=0))
+
+def check(layers, X, path=None, rows=None):
+    """
+    Max absolute difference between the batched forward pass and the reference loop (and
+    Keras itself when installed) on the first CHECK_ROWS windows of X.
+    """
+    X = np.asarray(X[:rows or CHECK_ROWS], dtype=np.float32)
+    if len(X) == 0:
+        raise ValueError("no complete windows to check")
+    batched = forward(layers, X)
+    report = {'rows': len(X), 'reference_max_abs_diff': float(np.abs(batched - reference_forward(layers, X)).max())}
+    expected = keras_forward(path or MODEL_PATH, X)
+    if expected is not None:
+        report['keras_max_abs_diff'] = float(np.abs(batched - expected.reshape(batched.shape)).max())
+    report['ok'] = all(v <= CHECK_TOLERANCE for k, v in report.items() if k.endswith('diff'))
+    return report
+
+# ==========================================
+# 3. FORECASTS
+# ==========================================
+def windows(series, window=None):
+    """
+    Every window of `window` consecutive values along the last axis: (..., n - window + 1, window),
+    a zero-copy strided view of series.
+    """
+    return sliding_window_view(series, window or WINDOW, axis=-1)
+
+def complete_windows(series, window=None):
+    """Which windows of series (n_series, timesteps) hold no NaN, from running NaN counts (no window copy)."""
+    window = window or WINDOW
+    nans = np.concatenate([np.zeros((len(series), 1), dtype=np.int64), np.cumsum(np.isnan(series), axis=1)], axis=1)
+    return (nans[:, window:] - nans[:, :-window]) == 0
+
+def last_windows(series, window=None):
+    """
+    The latest full window of each series (a list of 1-D arrays of any length, NaNs dropped),
+    stacked to (n_series, window); series shorter than window come back as NaN rows.
+    """
+    window = window or WINDOW
+    stacked = np.full((len(series), window), np.nan, dtype=np.float32)
+    for i, values in enumerate(series):
+        values = np.asarray(values, dtype=np.float32)
+        values = values[~np.isnan(values)]
+        if len(values) >= window:
+            stacked[i] = windows(values, window)[-1]
+    return stacked
+
+def per_series(values, ndim):
+    """(n_series,) values shaped to broadcast against an ndim array with series on axis 0."""
+    return values.reshape((-1,) + (1,) * (ndim - 1))
+
+def forecast(layers, series, window=None, bounds=None, every_window=False, batch_rows=None):
+    """
+    Next-step forecast (the model's first output) for many series in one batched pass.
+    series: (n_series, timesteps) array, or a list of 1-D arrays of different lengths.
+    bounds: (min, max) the model's inputs were min-max scaled with, per series or global;
+            inputs are scaled to [0, 1] and outputs mapped back. None = raw values.
+    every_window: forecast after every window (backtest, (n_series, n_windows)) instead of only
+                  the latest one ((n_series,)). Needs equal-length series.
+    Windows stay a strided view of the series; only BATCH_ROWS of them are copied at a time.
+    """
+    window = window or WINDOW
+    batch_rows = batch_rows or BATCH_ROWS
+    if every_window:
+        values = np.asarray(series, dtype=np.float32)
+    else:
+        values = last_windows(series, window)
+    n_series = len(values)
+
+    if bounds is not None:
+        lo = np.broadcast_to(np.asarray(bounds[0], dtype=np.float32), (n_series,))
+        span = np.broadcast_to(np.asarray(bounds[1], dtype=np.float32), (n_series,)) - lo
+        values = (values - per_series(lo, 2)) / per_series(span, 2)
+
+    if every_window:
+        view, valid = windows(values, window), complete_windows(values, window)   # (n_series, n_windows, window)
+    else:
+        view, valid = values, ~np.isnan(values).any(axis=1)                        # (n_series, window)
+
+    out = np.full(valid.shape, np.nan, dtype=np.float32)
+    rows = np.argwhere(valid)
+    for start in range(0, len(rows), batch_rows):
+        idx = tuple(rows[start:start + batch_rows].T)
+        out[idx] = forward(layers, view[idx][..., None], batch_rows).reshape(len(rows[start:start + batch_rows]), -1)[:, 0]
+    if bounds is not None:
+        out = out * per_series(span, out.ndim) + per_series(lo, out.ndim)
+    return out
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NumPy-only forecasts from the Keras price LSTM (.h5).")
+    parser.add_argument('prices', help="CSV with one column per market / series, rows in time order")
+    parser.add_argument('--model', default=None, help=f"Keras .h5 file (default: {MODEL_PATH})")
+    parser.add_argument('--window', type=int, default=WINDOW)
+    parser.add_argument('--scale', nargs=2, type=float, metavar=('MIN', 'MAX'), default=None,
+                        help="min-max bounds the model was trained with")
+    args = parser.parse_args()
+
+    try:
+        layers = load_layers(args.model)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+    prices = pd.read_csv(args.prices).select_dtypes('number')
+    series = [prices[col].to_numpy(dtype=np.float32) for col in prices.columns]
+    print(f"[INFO] {len(layers)} layers, {len(series)} series, window {args.window}")
+
+    inputs = last_windows(series, args.window)
+    inputs = inputs[~np.isnan(inputs).any(axis=1)]
+    if len(inputs) == 0:
+        print(f"[ERROR] No series has {args.window} consecutive values; nothing to forecast.")
+        sys.exit(1)
+    if args.scale:
+        inputs = (inputs - args.scale[0]) / (args.scale[1] - args.scale[0])
+    report = check(layers, inputs[..., None], args.model)
+    print(f"[{'INFO' if report['ok'] else 'WARN'}] Numerical check: {report}")
+
+    started = time.perf_counter()
+    result = forecast(layers, series, args.window, args.scale)
+    print(f"[DONE] {len(series)} forecasts in {(time.perf_counter() - started) * 1000:.1f} ms")
+    print(pd.DataFrame({'Series': prices.columns, 'Last': prices.ffill().iloc[-1].to_numpy(), 'Forecast': result}).to_string(index=False))
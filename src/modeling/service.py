@@ -0,0 +1,348 @@
+import pandas as pd
+import numpy as np
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import joblib
+from src.modeling import datasets
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+MODEL_PATH = os.path.join(datasets.LEGACY_MODELS_DIR, "crop_yield_rf.pkl")
+KEY_COLUMNS = ['State', 'District', 'Year', 'Crop']
+# District climate features of the model-ready data, used when the model does not carry its own names
+FEATURES = ['Avg_Temp', 'Total_Rainfall', 'Avg_Humidity', 'Temp_Stress', 'Rain_Deviation', 'GDD',
+            'Longest_Dry_Spell', 'Heavy_Rain_Days', 'Heat_Stress_Days', 'Disease_Windows']
+
+HOST = '127.0.0.1'
+PORT = 8000
+CACHE_SIZE = 50000       # (state, district, year, crop) feature rows kept in memory
+LATENCY_WINDOW = 10000   # latest requests per endpoint used for the percentiles
+MAX_BATCH = 10000
+
+# ==========================================
+# 1. MODEL
+# ==========================================
+def load_model(path=None):
+    """The fitted estimator (joblib / pickle file). Fails loudly on a missing or placeholder file."""
+    path = path or MODEL_PATH
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model not found at {path}")
+    if os.path.getsize(path) < 16:
+        raise ValueError(f"{path} is an empty placeholder ({os.path.getsize(path)} bytes); save a fitted model there first")
+    model = joblib.load(path)
+    if not hasattr(model, 'predict'):
+        raise TypeError(f"{path} holds a {type(model).__name__}, not a fitted estimator")
+    return model
+
+def model_features(model):
+    """Input columns in the order the model was fitted on (feature_names_in_, else FEATURES)."""
+    names = getattr(model, 'feature_names_in_', None)
+    if names is not None:
+        return [str(name) for name in names]
+    n_features = getattr(model, 'n_features_in_', len(FEATURES))
+    if n_features != len(FEATURES):
+        raise ValueError(f"Model expects {n_features} unnamed features; FEATURES lists {len(FEATURES)}")
+    return list(FEATURES)
+
+def forest_predictor(model):
+    """
+    Fast path for fitted sklearn random / extra-trees forests: averages every tree's low-level
+    tree_.predict directly. model.predict dispatches each tree through joblib (~0.1 ms per tree),
+    which dominated single-row latency. Same values as predict (regressors) / predict_proba
+    (classifiers); None for any other model.
+    """
+    from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier, ExtraTreesRegressor, ExtraTreesClassifier
+    forests = (RandomForestRegressor, RandomForestClassifier, ExtraTreesRegressor, ExtraTreesClassifier)
+    if not isinstance(model, forests) or getattr(model, 'n_outputs_', 1) != 1:
+        return None
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    classifier = hasattr(model, 'predict_proba')
+
+    def predict(X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        total = 0
+        for tree in trees:
+            value = tree.predict(X)
+            total = total + (value / value.sum(axis=1, keepdims=True) if classifier else value[:, 0])
+        return total / len(trees)
+    return predict
+
+# ==========================================
+# 2. FEATURE CACHE
+# ==========================================
+def item_key(item):
+    """(state, district, year, crop) of a request item."""
+    missing = [k for k in ['state', 'district', 'year', 'crop'] if item.get(k) in (None, '')]
+    if missing:
+        raise ValueError(f"missing field(s): {', '.join(missing)}")
+    return (str(item['state']).strip(), str(item['district']).strip(), int(item['year']), str(item['crop']).strip())
+
+def item_overrides(item, features):
+    """{feature position: value} for the features a request item sets itself."""
+    overrides = {}
+    for j, name in enumerate(features):
+        if name in item:
+            try:
+                overrides[j] = float(item[name])
+            except (ValueError, TypeError):
+                raise ValueError(f"{name} must be a number, got {item[name]!r}")
+    return overrides
+
+class FeatureCache:
+    """
+    LRU of feature rows keyed by (state, district, year, crop). All misses of a batch are read from
+    the model-ready dataset in one filtered Parquet read; keys with no data are cached as NaN rows
+    so repeated unknown keys do not go back to disk.
+    """
+    def __init__(self, features, data=None, size=None):
+        self.features = features
+        self.data = data
+        self.size = size or CACHE_SIZE
+        self.rows = OrderedDict()
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    def read(self, keys):
+        """{key: feature row} for the keys found in the dataset."""
+        filters = [('State', 'in', sorted({k[0] for k in keys})), ('District', 'in', sorted({k[1] for k in keys})),
+                   ('Year', 'in', sorted({k[2] for k in keys}))]
+        df = datasets.load_model_ready(self.data, sorted({k[3] for k in keys}), KEY_COLUMNS + self.features, filters)
+        found = zip(df['State'].astype(str), df['District'].astype(str), df['Year'].astype(int), df['Crop'])
+        return dict(zip(found, df[self.features].to_numpy(dtype=np.float64)))
+
+    def store(self, rows):
+        with self.lock:
+            for key, row in rows.items():
+                self.rows[key] = row
+                self.rows.move_to_end(key)
+            while len(self.rows) > self.size:
+                self.rows.popitem(last=False)
+
+    def warm(self, crops=None):
+        """Loads every row (of some crops) up front, up to the cache size."""
+        df = datasets.load_model_ready(self.data, crops, KEY_COLUMNS + self.features)
+        keys = zip(df['State'].astype(str), df['District'].astype(str), df['Year'].astype(int), df['Crop'])
+        rows = dict(zip(keys, df[self.features].to_numpy(dtype=np.float64)))
+        self.store(dict(list(rows.items())[-self.size:]))
+        return len(rows)
+
+    def lookup(self, keys):
+        """Feature matrix (one row per key, a fresh copy); NaN rows for keys with no data."""
+        found = {}
+        with self.lock:
+            for key in keys:
+                if key in self.rows:
+                    self.rows.move_to_end(key)
+                    found[key] = self.rows[key]
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            self.hits += sum(key in found for key in keys)
+            self.misses += len(keys) - sum(key in found for key in keys)
+
+        if missing:
+            loaded = self.read(missing)
+            absent = np.full(len(self.features), np.nan)
+            loaded = {key: loaded.get(key, absent) for key in missing}
+            self.store(loaded)
+            found.update(loaded)
+        if not keys:
+            return np.empty((0, len(self.features)))
+        return np.array([found[key] for key in keys], dtype=np.float64)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'entries': len(self.rows), 'size': self.size, 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else None}
+
+# ==========================================
+# 3. SCORING
+# ==========================================
+class Latencies:
+    """Request counts and the latest LATENCY_WINDOW latencies per endpoint."""
+    def __init__(self, window=None):
+        self.window = window or LATENCY_WINDOW
+        self.samples = {}
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, seconds):
+        with self.lock:
+            self.samples.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+
+    def summary(self):
+        with self.lock:
+            samples = {endpoint: np.array(values) * 1000 for endpoint, values in self.samples.items()}
+            counts = dict(self.counts)
+        return {endpoint: {'count': counts[endpoint],
+                           **{f'p{q}_ms': round(float(np.percentile(ms, q)), 3) for q in (50, 90, 99)},
+                           'max_ms': round(float(ms.max()), 3)}
+                for endpoint, ms in samples.items()}
+
+class ScoringService:
+    """The model, loaded once, with its feature cache and latency counters."""
+    def __init__(self, model, data=None, cache_size=None):
+        self.model = model
+        self.features = model_features(model)
+        self.named = getattr(model, 'feature_names_in_', None) is not None
+        self.classifier = hasattr(model, 'predict_proba')
+        self.fast = forest_predictor(model)
+        self.cache = FeatureCache(self.features, data, cache_size)
+        self.latencies = Latencies()
+        self.started = time.time()
+
+    def score(self, items):
+        """
+        One result per item, from a single predict call over the whole batch. Items carry
+        state / district / year / crop; any feature given in an item overrides the cached value
+        (e.g. a rainfall scenario).
+        """
+        # A bad item gets its own {'error': ...} result; the rest of the batch is still scored
+        keys, overrides, errors = [], [], {}
+        for i, item in enumerate(items):
+            try:
+                key, values = item_key(item), item_overrides(item, self.features)
+            except (ValueError, TypeError, AttributeError) as e:
+                key, values = None, {}
+                errors[i] = str(e)
+            keys.append(key)
+            overrides.append(values)
+
+        X = np.full((len(items), len(self.features)), np.nan)
+        valid = [i for i, key in enumerate(keys) if key is not None]
+        X[valid] = self.cache.lookup([keys[i] for i in valid])
+        for i in valid:
+            for j, value in overrides[i].items():
+                X[i, j] = value
+
+        usable = ~np.isnan(X).any(axis=1)
+        for i in valid:
+            if not usable[i]:
+                errors[i] = f"no features for {keys[i]}"
+        results = [{'error': errors[i]} if i in errors else {} for i in range(len(items))]
+        if usable.any():
+            predictions, proba = self.infer(X[usable])
+            for n, i in enumerate(np.flatnonzero(usable)):
+                results[i]['prediction'] = predictions[n].item()
+                if proba is not None:
+                    results[i]['probabilities'] = {str(c): round(float(p), 6) for c, p in zip(self.model.classes_, proba[n])}
+        return results
+
+    def infer(self, X):
+        """(predictions, class probabilities or None) for a feature matrix, in one pass."""
+        if self.fast is not None:
+            output = self.fast(X)
+        else:
+            inputs = pd.DataFrame(X, columns=self.features) if self.named else X
+            output = self.model.predict_proba(inputs) if self.classifier else self.model.predict(inputs)
+        if self.classifier:
+            return self.model.classes_[output.argmax(axis=1)], output
+        return output, None
+
+    def health(self):
+        return {'status': 'ok', 'model': type(self.model).__name__, 'features': self.features,
+                'uptime_s': round(time.time() - self.started, 1)}
+
+    def stats(self):
+        return {'latency': self.latencies.summary(), 'cache': self.cache.stats()}
+
+# ==========================================
+# 4. HTTP
+# ==========================================
+class Handler(BaseHTTPRequestHandler):
+    """
+    GET  /health          model and feature list
+    GET  /stats           latency percentiles per endpoint, cache hit rate
+    POST /predict         {"state", "district", "year", "crop", [feature overrides]}
+    POST /predict/batch   {"items": [...]} (or a bare list)
+    """
+    def reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'null')
+
+    def timed(self, route):
+        started = time.perf_counter()
+        try:
+            status, body = route()
+        except (ValueError, TypeError) as e:
+            status, body = 400, {'error': str(e)}
+        except Exception as e:
+            status, body = 500, {'error': f"{type(e).__name__}: {e}"}
+        self.reply(status, body)
+        self.server.service.latencies.record(f"{self.command} {self.path}", time.perf_counter() - started)
+
+    def do_GET(self):
+        service = self.server.service
+        routes = {'/health': lambda: (200, service.health()), '/stats': lambda: (200, service.stats())}
+        self.timed(routes.get(self.path, lambda: (404, {'error': f"unknown path {self.path}"})))
+
+    def do_POST(self):
+        self.timed({'/predict': self.predict, '/predict/batch': self.predict_batch}.get(
+            self.path, lambda: (404, {'error': f"unknown path {self.path}"})))
+
+    def predict(self):
+        item = self.read_json()
+        if not isinstance(item, dict):
+            raise ValueError("expected a JSON object")
+        item_key(item)
+        item_overrides(item, self.server.service.features)
+        result = self.server.service.score([item])[0]
+        return (404 if 'error' in result else 200), result
+
+    def predict_batch(self):
+        body = self.read_json()
+        items = body.get('items') if isinstance(body, dict) else body
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValueError("expected {\"items\": [objects]}")
+        if len(items) > MAX_BATCH:
+            return 413, {'error': f"batch of {len(items)} exceeds MAX_BATCH={MAX_BATCH}"}
+        return 200, {'results': self.server.service.score(items)}
+
+    def log_message(self, format, *args):
+        pass   # per-request access logs would dominate the latency; see /stats instead
+
+def serve(model_path=None, data=None, host=None, port=None, cache_size=None, warm=False):
+    model = load_model(model_path)
+    service = ScoringService(model, data, cache_size)
+    if warm:
+        print(f"[INFO] Warming feature cache... {service.cache.warm()} rows loaded")
+    server = ThreadingHTTPServer((host or HOST, port or PORT), Handler)
+    server.service = service
+    print(f"[INFO] Scoring with {type(model).__name__} on {len(service.features)} features")
+    print(f"[SUCCESS] Listening on http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"[DONE] {json.dumps(service.stats())}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local HTTP yield-scoring service.")
+    parser.add_argument('--model', default=None, help=f"fitted model file (default: {MODEL_PATH})")
+    parser.add_argument('--data', default=None, help="model-ready dataset (default: MODEL_READY_DATASET)")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE)
+    parser.add_argument('--warm', action='store_true', help="load every feature row at startup")
+    args = parser.parse_args()
+    try:
+        serve(args.model, args.data, args.host, args.port, args.cache_size, args.warm)
+    except (OSError, ValueError, TypeError) as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
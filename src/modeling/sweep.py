@@ -0,0 +1,227 @@
+import pandas as pd
+import numpy as np
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import scipy.cluster.hierarchy as sch
+from sklearn.cluster import KMeans
+from sklearn.metrics import silhouette_score
+from src.modeling import zoning
+from src.modeling.datasets import as_frame, YIELD_COL
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+K_VALUES = list(range(1, 11))                  # as the notebook's elbow plot
+LINKAGES = ['ward', 'average', 'complete']
+DEGREES = [1, 2, 3]
+SILHOUETTE_SAMPLE = 2000   # silhouette on at most this many points (O(sample^2) instead of O(n^2))
+TEST_SHARE = 0.2
+SEED = 42
+WORKERS = os.cpu_count() or 1
+
+# ==========================================
+# SHARED MATRICES
+# ==========================================
+def build_matrices(df, folder):
+    """
+    Per crop, the scaled zoning matrix (district profiles) and the regression matrix
+    (Total_Rainfall, Yield with both > 0, as the regression notebook filters), saved once as
+    .npy files. Workers memory-map them read-only, so every process reads the same pages
+    instead of receiving its own pickled copy. Returns {crop: {'profiles': path, 'rain_yield': path}}.
+    """
+    paths = {}
+    for i, (crop, crop_df) in enumerate(df.groupby(df['Crop'].astype(str), sort=True)):
+        profiles = zoning.district_profiles(crop_df)
+        X = zoning.standardize(profiles[zoning.PROFILE_FEATURES].to_numpy(dtype=np.float64))
+        rain = crop_df['Total_Rainfall'].to_numpy(dtype=np.float64)
+        yields = crop_df[YIELD_COL].to_numpy(dtype=np.float64)
+        keep = (rain > 0) & (yields > 0)
+        paths[crop] = {'profiles': os.path.join(folder, f"{i}_profiles.npy"),
+                       'rain_yield': os.path.join(folder, f"{i}_rain_yield.npy")}
+        np.save(paths[crop]['profiles'], X)
+        np.save(paths[crop]['rain_yield'], np.column_stack([rain[keep], yields[keep]]))
+    return paths
+
+_mapped = {}       # per-process cache: path -> read-only memmap
+_compressed = {}   # per-process cache: path -> zoning.compress() of that matrix
+_merges = {}       # per-process cache: path -> full weighted Ward merge order of its centroids
+
+def matrix(path):
+    if path not in _mapped:
+        _mapped[path] = np.load(path, mmap_mode='r')
+    return _mapped[path]
+
+def compressed(path):
+    """Micro-clusters of a zoning matrix, computed once per worker and reused for every linkage / k."""
+    if path not in _compressed:
+        _compressed[path] = zoning.compress(np.asarray(matrix(path)))
+    return _compressed[path]
+
+def ward_merges(path):
+    """Ward merges are nested, so one full merge order serves every k."""
+    if path not in _merges:
+        centroids, weights, _ = compressed(path)
+        _merges[path] = zoning.ward_merges(centroids, weights)
+    return _merges[path]
+
+# ==========================================
+# TASKS (run in worker processes)
+# ==========================================
+def centers_of(X, labels):
+    """(cluster centers, sizes) for labels 0..k-1."""
+    sizes = np.bincount(labels).astype(np.float64)
+    centers = np.zeros((len(sizes), X.shape[1]))
+    np.add.at(centers, labels, X)
+    return centers / sizes[:, None], sizes
+
+def davies_bouldin(X, labels):
+    """
+    Davies-Bouldin index in O(n * k) from cluster centers (same definition as sklearn's
+    davies_bouldin_score, without its per-call overhead, which dominated the sweep).
+    """
+    centers, sizes = centers_of(X, labels)
+    scatter = np.bincount(labels, weights=np.linalg.norm(X - centers[labels], axis=1)) / sizes
+    distances = np.linalg.norm(centers[:, None, :] - centers[None, :, :], axis=2)
+    if np.allclose(scatter, 0) or np.allclose(distances, 0):
+        return 0.0
+    distances[distances == 0] = np.inf
+    return float(np.mean(np.max((scatter[:, None] + scatter[None, :]) / distances, axis=1)))
+
+def cluster_scores(X, labels):
+    """Sampled silhouette and Davies-Bouldin; NaN where a score is undefined (one cluster)."""
+    labels = np.unique(labels, return_inverse=True)[1]
+    k = labels.max() + 1
+    if k < 2 or k >= len(X):
+        return np.nan, np.nan
+    sample = min(len(X), SILHOUETTE_SAMPLE)
+    silhouette = silhouette_score(X, labels, sample_size=sample, random_state=SEED)
+    return silhouette, davies_bouldin(X, labels)
+
+def run_kmeans(X, k):
+    model = KMeans(n_clusters=k, init='k-means++', n_init=10, random_state=SEED).fit(X)
+    return model.labels_, model.inertia_
+
+def run_hierarchical(X, linkage, k, path):
+    """Same compressed pipeline as zoning: micro-clusters, then the linkage on their centroids."""
+    centroids, weights, assigned = compressed(path)
+    if linkage == 'ward':
+        labels = zoning.cut_merges(ward_merges(path), len(centroids), k)
+    elif len(centroids) <= k:
+        labels = np.arange(len(centroids))
+    else:
+        labels = sch.fcluster(sch.linkage(centroids, method=linkage), k, criterion='maxclust') - 1
+    labels = np.unique(labels[assigned], return_inverse=True)[1]
+    centers, _ = centers_of(X, labels)
+    return labels, ((X - centers[labels]) ** 2).sum()
+
+def run_polynomial(data, degree):
+    """
+    Rain -> yield polynomial on an 80/20 split (closed-form least squares on scaled rain).
+    Returns test R2 / RMSE and the optimal rainfall when the degree-2 curve opens downwards.
+    """
+    rng = np.random.default_rng(SEED)
+    order = rng.permutation(len(data))
+    n_test = int(round(len(data) * TEST_SHARE))
+    test, train = order[:n_test], order[n_test:]
+    rain, yields = data[:, 0], data[:, 1]
+    mean, std = rain[train].mean(), rain[train].std() or 1.0
+    design = lambda idx: np.vander((rain[idx] - mean) / std, degree + 1, increasing=True)
+    coef = np.linalg.lstsq(design(train), yields[train], rcond=None)[0]
+    pred = design(test) @ coef
+    resid = yields[test] - pred
+    r2 = 1 - (resid ** 2).sum() / ((yields[test] - yields[test].mean()) ** 2).sum()
+    optimal = np.nan
+    if degree == 2 and coef[2] < 0:
+        optimal = mean + std * (-coef[1] / (2 * coef[2]))
+    return {'r2': r2, 'rmse': np.sqrt((resid ** 2).mean()), 'optimal_rain': optimal, 'n': len(data)}
+
+def run_task(task):
+    """One configuration: (model, crop, matrix path, params). Returns a result row."""
+    model, crop, path, params = task
+    started = time.perf_counter()
+    row = {'model': model, 'crop': crop, **params}
+    if model == 'polynomial':
+        row.update(run_polynomial(matrix(path), params['degree']))
+    else:
+        X = np.asarray(matrix(path))
+        if params['k'] > len(X):
+            return None
+        if model == 'kmeans':
+            labels, inertia = run_kmeans(X, params['k'])
+        else:
+            labels, inertia = run_hierarchical(X, params['linkage'], params['k'], path)
+        silhouette, db = cluster_scores(X, labels)
+        row.update({'inertia': inertia, 'silhouette': silhouette, 'davies_bouldin': db, 'n': len(X)})
+    row['seconds'] = round(time.perf_counter() - started, 4)
+    return row
+
+def sweep_tasks(paths, k_values=None, linkages=None, degrees=None):
+    k_values = k_values or K_VALUES
+    linkages = linkages or LINKAGES
+    degrees = degrees or DEGREES
+    tasks = []
+    for crop, crop_paths in paths.items():
+        tasks += [('kmeans', crop, crop_paths['profiles'], {'k': k}) for k in k_values]
+        tasks += [('hierarchical', crop, crop_paths['profiles'], {'linkage': link, 'k': k})
+                  for link in linkages for k in k_values if k > 1]
+        tasks += [('polynomial', crop, crop_paths['rain_yield'], {'degree': d}) for d in degrees]
+    return tasks
+
+# ==========================================
+# RUNNER
+# ==========================================
+def run_sweep(data=None, crops=None, k_values=None, linkages=None, degrees=None, workers=None):
+    """
+    Every configuration (k, linkage, polynomial degree) for every crop across a process pool.
+    data: a model-ready DataFrame or the dataset path (None = MODEL_READY_DATASET).
+    Returns one row per configuration.
+    """
+    workers = workers or WORKERS
+    df = as_frame(data, crops, zoning.DISTRICT_KEYS + zoning.ROW_FEATURES)
+    folder = tempfile.mkdtemp(prefix="krishisense_sweep_")
+    try:
+        paths = build_matrices(df, folder)
+        tasks = sweep_tasks(paths, k_values, linkages, degrees)
+        print(f"[INFO] Sweeping {len(tasks)} configurations over {len(paths)} crops ({workers} worker(s))...")
+        if workers <= 1:
+            rows = [run_task(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                rows = list(pool.map(run_task, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    finally:
+        _mapped.clear()
+        _compressed.clear()
+        _merges.clear()
+        shutil.rmtree(folder, ignore_errors=True)
+    return pd.DataFrame([row for row in rows if row is not None])
+
+def best_configs(results):
+    """Per crop: best clustering by sampled silhouette and best polynomial degree by test R2."""
+    clusters = results[results['model'] != 'polynomial'].dropna(subset=['silhouette'])
+    best_cluster = clusters.loc[clusters.groupby('crop')['silhouette'].idxmax()]
+    poly = results[results['model'] == 'polynomial']
+    best_poly = poly.loc[poly.groupby('crop')['r2'].idxmax()]
+    return best_cluster.set_index('crop'), best_poly.set_index('crop')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Model-selection sweep over zoning and rain-response models.")
+    parser.add_argument('--crops', nargs='+', default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = run_sweep(crops=args.crops, workers=args.workers)
+    best_cluster, best_poly = best_configs(results)
+    print("-" * 40)
+    print("BEST ZONING CONFIGURATION PER CROP (sampled silhouette)")
+    print("-" * 40)
+    print(best_cluster[['model', 'linkage', 'k', 'silhouette', 'davies_bouldin']].to_string())
+    print("-" * 40)
+    print("BEST RAIN-RESPONSE DEGREE PER CROP (test R2)")
+    print("-" * 40)
+    print(best_poly[['degree', 'r2', 'rmse']].to_string())
+    print(f"\n[DONE] {len(results)} configurations in {time.perf_counter() - started:.1f}s")
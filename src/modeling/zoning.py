@@ -0,0 +1,184 @@
+import pandas as pd
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from src.modeling.datasets import as_frame, YIELD_COL
+
+# ==========================================
+# CONFIGURATION
+# ==========================================
+# Same climate (input) + yield (output) features as notebooks/clustering.ipynb,
+# plus yield stability (coefficient of variation across years)
+ROW_FEATURES = ['Avg_Temp', 'Total_Rainfall', YIELD_COL]
+PROFILE_FEATURES = ROW_FEATURES + ['Yield_CV']
+DISTRICT_KEYS = ['Crop', 'State', 'District']
+
+N_ZONES = 3
+MAX_CENTROIDS = 256      # hierarchical step never sees more points than this
+BATCH_ROWS = 4096        # profiles per micro-clustering partial_fit call
+SEED = 42
+
+ZONE_LABELS = {
+    'high': "LOW RISK / HIGH YIELD (Ideal for Investment)",
+    'mid': "MEDIUM RISK / MODERATE YIELD",
+    'low': "HIGH RISK / LOW YIELD (Requires Irrigation Support)"
+}
+
+# ==========================================
+# 1. DISTRICT PROFILES
+# ==========================================
+def district_profiles(df):
+    """
+    One row per (Crop, State, District): mean temperature, rainfall and yield over its years,
+    Yield_CV (std / mean of yield) and Years. Replaces clustering every district-year row.
+    """
+    df = df.dropna(subset=ROW_FEATURES)
+    grouped = df.groupby([df[k].astype(str) for k in DISTRICT_KEYS], sort=True)
+    profiles = grouped[ROW_FEATURES].mean().astype(np.float64)
+    spread = grouped[YIELD_COL].std(ddof=0).astype(np.float64)
+    profiles['Yield_CV'] = (spread / profiles[YIELD_COL].where(profiles[YIELD_COL] > 0)).fillna(0.0)
+    profiles['Years'] = grouped.size()
+    return profiles.reset_index()
+
+# ==========================================
+# 2. STREAMING COMPRESSION (micro-clusters)
+# ==========================================
+def compress(X, max_centroids=None, batch_rows=None):
+    """
+    Micro-clusters X into at most max_centroids points with mini-batch k-means fed in batches
+    (partial_fit), so memory and time grow linearly with the number of profiles.
+    Returns (centroids, weights, assignment of every row).
+    With no more rows than max_centroids every row is its own centroid (exact result).
+    """
+    max_centroids = max_centroids or MAX_CENTROIDS
+    batch_rows = max(batch_rows or BATCH_ROWS, max_centroids)
+    if len(X) <= max_centroids:
+        return X.copy(), np.ones(len(X)), np.arange(len(X))
+
+    # BIRCH's radius-based tree was tried first; at 100k+ profiles it needs several refits to
+    # reach a centroid budget and is ~10x slower than a fixed-k mini-batch pass
+    micro = MiniBatchKMeans(n_clusters=max_centroids, batch_size=batch_rows, n_init=1, random_state=SEED)
+    for start in range(0, len(X), batch_rows):
+        micro.partial_fit(X[start:start + batch_rows])
+
+    # Weights and centroids from the final assignment; empty micro-clusters dropped
+    assigned = micro.predict(X)
+    used, assigned = np.unique(assigned, return_inverse=True)
+    weights = np.bincount(assigned).astype(np.float64)
+    centroids = np.zeros((len(used), X.shape[1]))
+    np.add.at(centroids, assigned, X)
+    return centroids / weights[:, None], weights, assigned
+
+# ==========================================
+# 3. HIERARCHICAL STEP ON CENTROIDS
+# ==========================================
+def ward_merges(centroids, weights, n_clusters=1):
+    """
+    Ward agglomeration of weighted points down to n_clusters. Merging a and b costs
+    w_a * w_b / (w_a + w_b) * |c_a - c_b|^2 (the within-cluster variance increase), so a centroid
+    standing for 40 districts weighs like 40 districts. With unit weights this is plain Ward.
+    Returns the merges in order as (kept, absorbed) point indices.
+    """
+    m = len(centroids)
+    if m <= n_clusters:
+        return np.zeros((0, 2), dtype=np.int64)
+    c = np.asarray(centroids, dtype=np.float64).copy()
+    w = np.asarray(weights, dtype=np.float64).copy()
+
+    def costs(i, others):
+        return w[i] * w[others] / (w[i] + w[others]) * ((c[others] - c[i]) ** 2).sum(axis=1)
+
+    sq = ((c[:, None, :] - c[None, :, :]) ** 2).sum(axis=2)
+    cost = w[:, None] * w[None, :] / (w[:, None] + w[None, :]) * sq
+    np.fill_diagonal(cost, np.inf)
+    active = np.ones(m, dtype=bool)
+
+    merges = []
+    for _ in range(m - n_clusters):
+        i, j = np.unravel_index(np.argmin(cost), cost.shape)
+        i, j = min(i, j), max(i, j)
+        c[i] = (w[i] * c[i] + w[j] * c[j]) / (w[i] + w[j])
+        w[i] += w[j]
+        active[j] = False
+        merges.append((i, j))
+        cost[j, :] = np.inf
+        cost[:, j] = np.inf
+        others = np.flatnonzero(active)
+        others = others[others != i]
+        cost[i, others] = cost[others, i] = costs(i, others)
+    return np.array(merges, dtype=np.int64).reshape(-1, 2)
+
+def cut_merges(merges, m, n_clusters):
+    """Labels (0..n_clusters-1) of m points after the first m - n_clusters merges."""
+    labels = np.arange(m)
+    for i, j in merges[:max(0, m - n_clusters)]:
+        labels[labels == j] = i
+    return np.unique(labels, return_inverse=True)[1]
+
+def weighted_ward(centroids, weights, n_clusters):
+    """Weighted Ward labels for every centroid (see ward_merges)."""
+    return cut_merges(ward_merges(centroids, weights, n_clusters), len(centroids), n_clusters)
+
+def standardize(X):
+    """Column z-scores (StandardScaler without the object); constant columns become 0."""
+    std = X.std(axis=0)
+    return (X - X.mean(axis=0)) / np.where(std > 0, std, 1.0)
+
+# ==========================================
+# ZONES
+# ==========================================
+def zone_crop(profiles, n_zones=None, max_centroids=None):
+    """Zone labels for one crop's district profiles (0 = highest mean yield)."""
+    n_zones = n_zones or N_ZONES
+    X = standardize(profiles[PROFILE_FEATURES].to_numpy(dtype=np.float64))
+    centroids, weights, assigned = compress(X, max_centroids)
+    zones = weighted_ward(centroids, weights, n_zones)[assigned]
+
+    # Order zones by yield, as the notebook's interpretation does
+    yields = pd.Series(profiles[YIELD_COL].to_numpy()).groupby(zones).mean()
+    rank = {zone: r for r, zone in enumerate(yields.sort_values(ascending=False).index)}
+    return np.array([rank[z] for z in zones])
+
+def zone_label(zone, n_zones):
+    if zone == 0:
+        return ZONE_LABELS['high']
+    if zone == n_zones - 1:
+        return ZONE_LABELS['low']
+    return ZONE_LABELS['mid']
+
+def build_zones(data=None, crops=None, n_zones=None, max_centroids=None):
+    """
+    Agro-climatic zones for every crop in the model-ready data (all TARGET_CROPS by default).
+    data: a model-ready DataFrame, or the dataset path (None = MODEL_READY_DATASET).
+    Returns (districts, zones):
+      districts: one row per (Crop, State, District) with its profile, Zone and Zone_Label
+      zones:     one row per (Crop, Zone) with the mean profile and district count
+    """
+    n_zones = n_zones or N_ZONES
+    df = as_frame(data, crops, DISTRICT_KEYS + ROW_FEATURES)
+    profiles = district_profiles(df)
+
+    frames = []
+    for crop, crop_profiles in profiles.groupby('Crop', sort=True):
+        crop_profiles = crop_profiles.reset_index(drop=True)
+        k = min(n_zones, len(crop_profiles))
+        crop_profiles['Zone'] = zone_crop(crop_profiles, k, max_centroids)
+        crop_profiles['Zone_Label'] = [zone_label(z, k) for z in crop_profiles['Zone']]
+        frames.append(crop_profiles)
+        print(f"[INFO] {crop}: {len(crop_profiles)} districts -> {k} zones")
+    if not frames:
+        print("[WARN] No district profiles to zone.")
+        return None, None
+    districts = pd.concat(frames, ignore_index=True)
+
+    zones = districts.groupby(['Crop', 'Zone', 'Zone_Label'], sort=True).agg(
+        Districts=('District', 'size'), **{f: (f, 'mean') for f in PROFILE_FEATURES}
+    ).reset_index()
+    return districts, zones
+
+if __name__ == "__main__":
+    districts, zones = build_zones()
+    if zones is not None:
+        print("-" * 40)
+        print("AGRO-CLIMATIC ZONE PROFILES")
+        print("-" * 40)
+        print(zones.to_string(index=False))